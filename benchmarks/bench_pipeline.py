@@ -0,0 +1,276 @@
+# ==============================================================================
+# BENCHMARK - PIPELINE COMPLET HORS LIGNE (SITE BRVM LOCAL + MODÈLE SIMULÉ)
+# ==============================================================================
+# Sert des pages `rapports-societes-cotees`, des pages société et des PDF
+# synthétiques depuis un serveur HTTP local, remplace `genai` par un modèle
+# simulé (latence et taux d'échec configurables) puis exécute BRVMAnalyzer de
+# bout en bout : collecte HTTP, téléchargement, analyse, rapport Word écrit au fil de l'eau.
+#
+# Mesures par palier : débit (rapports/min), pic mémoire, latences par étape.
+#
+# Usage : python benchmarks/bench_pipeline.py [--sizes 47 500 5000] [--workers 8]
+#                                            [--llm-latency 0.2] [--failure-rate 0.0] [--batch 6]
+#                                            [--output bench_pipeline.json]
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.api_core import exceptions as google_exceptions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import BRVMAnalyzer, AnalysisJournal, StreamingReport, LISTING_MAX_PAGES
+
+
+# ------------------------------------------------------------------------------
+# 1. SITE BRVM SYNTHÉTIQUE
+# ------------------------------------------------------------------------------
+def build_pdf(page_texts, min_bytes):
+    """PDF minimal valide (une ligne de texte Helvetica par page), complété par un commentaire jusqu'à min_bytes."""
+    n = len(page_texts)
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>',
+               f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(n))}] /Count {n} >>"]
+    for i, text in enumerate(page_texts):
+        stream = f'BT /F1 11 Tf 40 750 Td ({text}) Tj ET'
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {4 + 2 * i} 0 R '
+                       f'/Resources << /Font << /F1 {3 + 2 * n} 0 R >> >> >>')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    objects.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    out = '%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f'{i + 1} 0 obj\n{obj}\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n' + ''.join(f'{o:010d} 00000 n \n' for o in offsets)
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'
+    data = out.encode('latin-1')
+    if len(data) < min_bytes:
+        data += b'%' + b'0' * (min_bytes - len(data) - 2) + b'\n'
+    return data
+
+
+class SyntheticBRVMSite:
+    """Génère le contenu du site : les 47 sociétés réparties sur les pages de liste, N rapports au total."""
+
+    def __init__(self, societes_mapping, total_reports, pdf_bytes):
+        self.companies = list(societes_mapping.items())
+        per_company = math.ceil(total_reports / len(self.companies))
+        self.reports = {}
+        remaining = total_reports
+        for symbol, _ in self.companies:
+            count = min(per_company, remaining)
+            remaining -= count
+            self.reports[symbol] = [f"Communiqué financier 2025 - {symbol} - publication {i + 1}" for i in range(count)]
+        self.pdf = build_pdf([
+            "Rapport de gestion et gouvernance",
+            "Chiffre d'affaires en hausse de 8 %, resultat net en progression",
+            "Bilan : total actif et capitaux propres",
+            "Dividende propose de 500 FCFA par action",
+        ], pdf_bytes)
+        per_page = math.ceil(len(self.companies) / LISTING_MAX_PAGES)
+        self.listing_pages = [self.companies[i:i + per_page] for i in range(0, len(self.companies), per_page)]
+
+    def listing_html(self, page_num):
+        if page_num >= len(self.listing_pages):
+            return '<html><body><p>Aucun résultat.</p></body></html>'
+        # Libellé tel que publié sur le site : la première alternative connue du symbole.
+        rows = ''.join(f'<tr><td><a href="/fr/societe/{symbol.lower()}">{info["alternatives"][0].upper()}</a></td></tr>'
+                       for symbol, info in self.listing_pages[page_num])
+        return f'<html><body><table class="views-table"><tbody>{rows}</tbody></table></body></html>'
+
+    def company_html(self, symbol):
+        rows = ''.join(f'<tr><td>{title}</td><td><a href="/sites/default/files/{symbol.lower()}_{i}.pdf">PDF</a></td></tr>'
+                       for i, title in enumerate(self.reports.get(symbol, [])))
+        return f'<html><body><table class="views-table"><tbody>{rows}</tbody></table></body></html>'
+
+
+def serve_site(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            if path == '/fr/rapports-societes-cotees':
+                page_num = int(query.split('page=')[1]) if 'page=' in query else 0
+                self._send(site.listing_html(page_num).encode('utf-8'), 'text/html; charset=utf-8')
+            elif path.startswith('/fr/societe/'):
+                self._send(site.company_html(path.rsplit('/', 1)[1].upper()).encode('utf-8'), 'text/html; charset=utf-8')
+            elif path.endswith('.pdf'):
+                self._send(site.pdf, 'application/pdf')
+            else:
+                self.send_error(404)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ------------------------------------------------------------------------------
+# 2. MODÈLE GEMINI SIMULÉ
+# ------------------------------------------------------------------------------
+def make_fake_genai(llm_latency, upload_latency, failure_rate, context_limit_docs=0, seed=42):
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    def should_fail():
+        with rng_lock:
+            return rng.random() < failure_rate
+
+    class FakeResponse:
+        def __init__(self, text):
+            self.text = text
+            self.parts = [text]
+            self.prompt_feedback = None
+            self.usage_metadata = types.SimpleNamespace(prompt_token_count=1500, candidates_token_count=300)
+
+    class FakeModel:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def generate_content(self, contents, generation_config=None):
+            documents = sum(1 for part in contents if isinstance(part, str) and part.startswith('--- Document '))
+            if context_limit_docs and documents > context_limit_docs:
+                raise google_exceptions.InvalidArgument("The input token count exceeds the maximum number of tokens allowed (simulé)")
+            # Latence par requête, plus un supplément par document au-delà du premier.
+            time.sleep(llm_latency * (1 + 0.25 * max(0, documents - 1)))
+            if should_fail():
+                raise google_exceptions.ServiceUnavailable("Service Unavailable (simulé)")
+            structured = contents[0] is main.PROMPT_EXTRACTION_JSON
+            if structured:
+                analysis = {
+                    'periode': 'S1 2025', 'date_cloture': '2025-06-30', 'devise': 'FCFA',
+                    'chiffre_affaires': 1.2e10, 'variation_ca_pct': 8.0, 'resultat_net': 2.1e9,
+                    'variation_rn_pct': 5.5, 'dividende_par_action': 500, 'synthese': 'Analyse simulée.',
+                }
+            else:
+                analysis = "- **Chiffre d'affaires** : +8 %\n- **Résultat net** : +5,5 %\n- **Dividende** : 500 FCFA (analyse simulée)"
+            if documents:
+                return FakeResponse(json.dumps([
+                    dict(analysis, document=i + 1) if structured else {'document': i + 1, 'analyse': analysis}
+                    for i in range(documents)
+                ]))
+            return FakeResponse(json.dumps(analysis) if structured else analysis)
+
+    def upload_file(path, display_name=None):
+        time.sleep(upload_latency)
+        return types.SimpleNamespace(name=f"files/{os.path.basename(path)}")
+
+    return types.SimpleNamespace(
+        configure=lambda api_key=None: None,
+        GenerativeModel=FakeModel,
+        upload_file=upload_file,
+        delete_file=lambda name: None,
+    )
+
+
+# ------------------------------------------------------------------------------
+# 3. EXÉCUTION D'UN PALIER
+# ------------------------------------------------------------------------------
+def run_size(total_reports, args):
+    template = BRVMAnalyzer('', None).original_societes_mapping
+    site = SyntheticBRVMSite(template, total_reports, args.pdf_kb * 1024)
+    server, base_url = serve_site(site)
+    main.genai = make_fake_genai(args.llm_latency, args.upload_latency, args.failure_rate, args.context_limit_docs)
+
+    with tempfile.TemporaryDirectory(prefix='bench_brvm_') as workdir:
+        analyzer = BRVMAnalyzer(
+            '', 'fake-key', max_workers=args.workers, requests_per_minute=args.rpm,
+            scraper_mode='http', base_url=base_url, page_selection=args.page_selection,
+            max_attempts=args.max_attempts, batch_size=args.batch,
+            journal=AnalysisJournal(os.path.join(workdir, 'journal.jsonl')),
+        )
+        analyzer.configure_gemini()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        # Rapport écrit société par société pendant l'analyse, comme dans BRVMAnalyzer.run().
+        report = StreamingReport({'docx': os.path.join(workdir, 'rapport.docx')})
+        results = analyzer.process_all_companies(report=report)
+        with analyzer.run_metrics.stage('word_report'):
+            report.close()
+        elapsed = time.perf_counter() - start
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        analyzer.journal.close()
+
+    server.shutdown()
+    rapports = [r for data in results.values() for r in data['rapports_analyses']]
+    analyzed = sum(1 for r in rapports if not r.get('a_reessayer'))
+    summary = analyzer.run_metrics.summary()
+    return {
+        'reports': total_reports,
+        'analyzed': analyzed,
+        'failed': len(rapports) - analyzed,
+        'elapsed_s': round(elapsed, 3),
+        'reports_per_min': round(analyzed / elapsed * 60, 1) if elapsed else None,
+        'peak_python_mb': round(peak_traced / 1024 / 1024, 1),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'stages': summary['stages'],
+        'counters': summary['counters'],
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du pipeline BRVM.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[47, 500, 5000])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rpm', type=int, default=1_000_000,
+                        help="Quota simulé (par défaut illimité : on mesure le pipeline, pas le quota).")
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--upload-latency', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--max-attempts', type=int, default=main.MAX_ATTEMPTS)
+    parser.add_argument('--batch', type=int, default=1, help="Rapports par requête (mode lot de BRVMAnalyzer).")
+    parser.add_argument('--context-limit-docs', type=int, default=0,
+                        help="Le modèle simulé refuse les lots de plus de N documents (0 = pas de limite).")
+    parser.add_argument('--pdf-kb', type=int, default=200)
+    parser.add_argument('--page-selection', choices=['off', 'pages', 'text'], default='off')
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats (comparaison en CI).")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        main.logger.setLevel(main.logging.WARNING)
+
+    all_results = []
+    print(f"{'rapports':>9} {'analysés':>9} {'échecs':>7} {'durée (s)':>10} {'rapports/min':>13} {'pic Python (Mo)':>16} {'RSS max (Mo)':>13}")
+    for size in args.sizes:
+        result = run_size(size, args)
+        all_results.append(result)
+        print(f"{result['reports']:>9} {result['analyzed']:>9} {result['failed']:>7} {result['elapsed_s']:>10.2f} "
+              f"{result['reports_per_min']:>13,.0f} {result['peak_python_mb']:>16.1f} {result['max_rss_mb']:>13.1f}")
+        for name, stats in sorted(result['stages'].items(), key=lambda item: -item[1]['total_s']):
+            print(f"{'':>12}{name:<22} n={stats['count']:<6} p50={stats['p50_s']:.3f} s  p95={stats['p95_s']:.3f} s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': vars(args), 'results': all_results}, f, ensure_ascii=False, indent=2)
+        print(f"\nRésultats enregistrés dans {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+# ==============================================================================
+# BENCHMARK - RECONNAISSANCE DES SYMBOLES SUR DES LISTES SYNTHÉTIQUES
+# ==============================================================================
+# Compare l'ancien balayage linéaire (sous-chaînes, société par société) avec le
+# SymbolMatcher (automate construit une seule fois), sur des tableaux de
+# plusieurs milliers de lignes. Les sociétés fictives simulent l'extension à
+# d'autres émetteurs (obligations, fonds).
+#
+# Usage : python benchmarks/bench_symbol_matcher.py [--rows 5000] [--extra-issuers 500]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import BRVMAnalyzer, SymbolMatcher, normalize_text
+
+
+def build_mapping(base_mapping, extra_issuers):
+    mapping = dict(base_mapping)
+    for i in range(extra_issuers):
+        mapping[f'FCP{i:04d}'] = {
+            'nom_rapport': f'FCP EMETTEUR {i:04d}',
+            'alternatives': [f'fcp emetteur {i:04d}', f'obligation emetteur {i:04d}'],
+        }
+    return mapping
+
+
+def build_rows(mapping, rows, seed=42):
+    rng = random.Random(seed)
+    names = [info['nom_rapport'] for info in mapping.values()]
+    noise = ['Etats financiers 2024', 'Rapport annuel', 'Communiqué', 'S.A.', '- Côte d’Ivoire']
+    listing = []
+    for _ in range(rows):
+        if rng.random() < 0.1:
+            listing.append(f"Société inconnue {rng.randint(0, 10**6)}")
+        else:
+            listing.append(f"{rng.choice(names)} {rng.choice(noise)}")
+    return listing
+
+
+def legacy_match(mapping, company_name_normalized):
+    for symbol, info in mapping.items():
+        for alt in info['alternatives']:
+            if alt in company_name_normalized:
+                return symbol
+    return None
+
+
+def bench(label, func, rows):
+    start = time.perf_counter()
+    for row in rows:
+        func(row)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms  {len(rows) / elapsed:12,.0f} lignes/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la reconnaissance des symboles.")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--extra-issuers', type=int, default=500)
+    args = parser.parse_args()
+
+    mapping = build_mapping(BRVMAnalyzer('', None).original_societes_mapping, args.extra_issuers)
+    rows = build_rows(mapping, args.rows)
+    print(f"{len(mapping)} émetteurs, {len(rows)} lignes synthétiques\n")
+
+    start = time.perf_counter()
+    matcher = SymbolMatcher(mapping)
+    print(f"{'Construction du SymbolMatcher':<40} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    normalize_text.cache_clear()
+    normalized = [normalize_text(row) for row in rows]
+    legacy = bench("Balayage linéaire (ancien)", lambda row: legacy_match(mapping, row), normalized)
+    compiled = bench("SymbolMatcher (Aho-Corasick)", matcher.match, normalized)
+    print(f"\nAccélération : x{legacy / compiled:.1f}")
+
+    normalize_text.cache_clear()
+    bench("normalize_text (cache froid)", normalize_text, rows)
+    bench("normalize_text (cache chaud)", normalize_text, rows)
+
+
+if __name__ == "__main__":
+    main()
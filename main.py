@@ -13,23 +13,40 @@ import re
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from lxml import etree
 import os
 import sys
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 import io
 import unicodedata
 import urllib3
 import json
-from collections import defaultdict
+import hashlib
+import math
+import random
+import sqlite3
+import threading
+import argparse
+import tempfile
+import shutil
+import zipfile
+from html import escape as html_escape
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from contextlib import contextmanager
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 
-# Imports Selenium
-from seleniumwire import webdriver
+# Imports Selenium (selenium-wire n'est importé qu'à la demande, voir setup_selenium)
+from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
 
 # Imports pour l'authentification Google
 from google.oauth2 import service_account
@@ -37,22 +54,1598 @@ from google.oauth2 import service_account
 # NOUVEAU : Import pour l'API Gemini
 import google.generativeai as genai
 
+# Optionnel : extraction locale du texte des PDF (pré-sélection des pages)
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
 # Désactiver les avertissements de sécurité
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # ------------------------------------------------------------------------------
 # 2. CONFIGURATION DU LOGGING
 # ------------------------------------------------------------------------------
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s')
 logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------------------------------
-# 3. CLASSE PRINCIPALE DE L'ANALYSEUR
+# 3. PARAMÈTRES DE L'ANALYSE IA
+# ------------------------------------------------------------------------------
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
+
+# À incrémenter à chaque modification du prompt : les analyses déjà en cache
+# avec une ancienne version ne seront plus réutilisées.
+PROMPT_VERSION = 'v1'
+
+PROMPT_ANALYSE = """
+            Tu es un analyste financier expert spécialisé dans les entreprises de la zone UEMOA cotées à la BRVM.
+            Analyse le document PDF ci-joint, qui est un rapport financier, et fournis une synthèse concise en français, structurée en points clés.
+
+            Concentre-toi impérativement sur les aspects suivants :
+            - **Évolution du Chiffre d'Affaires (CA)** : Indique la variation en pourcentage et en valeur si possible. Mentionne les raisons de cette évolution.
+            - **Évolution du Résultat Net (RN)** : Indique la variation et les facteurs qui l'ont influencée.
+            - **Politique de Dividende** : Cherche toute mention de dividende proposé, payé ou des perspectives de distribution.
+            - **Performance des Activités Ordinaires/d'Exploitation** : Commente l'évolution de la rentabilité opérationnelle.
+            - **Perspectives et Points de Vigilance** : Relève tout point crucial pour un investisseur (endettement, investissements majeurs, perspectives, etc.).
+
+            Si une information n'est pas trouvée, mentionne-le clairement (ex: "Politique de dividende non mentionnée"). Sois factuel et base tes conclusions uniquement sur le document.
+            """
+
+# Mode extraction structurée : le modèle renvoie un objet JSON validé par
+# METRICS_SCHEMA puis stocké dans la table SQLite des métriques.
+PROMPT_EXTRACTION_JSON = """
+            Tu es un analyste financier expert spécialisé dans les entreprises de la zone UEMOA cotées à la BRVM.
+            Extrais du rapport financier ci-joint les indicateurs suivants et réponds UNIQUEMENT par un objet JSON
+            avec exactement ces clés (null si l'information est absente, montants en valeur absolue dans la devise du rapport) :
+            {
+              "periode": "libellé de la période couverte, ex. 'Exercice 2024', 'T1 2025', 'S1 2025'",
+              "date_cloture": "date de clôture de la période au format AAAA-MM-JJ",
+              "devise": "ex. 'FCFA'",
+              "chiffre_affaires": nombre,
+              "chiffre_affaires_precedent": nombre (même période de l'exercice précédent),
+              "variation_ca_pct": nombre (en %),
+              "resultat_net": nombre,
+              "resultat_net_precedent": nombre,
+              "variation_rn_pct": nombre (en %),
+              "dividende_par_action": nombre,
+              "synthese": "synthèse en français de 3 phrases maximum (CA, RN, dividende, points de vigilance)"
+            }
+            Sois factuel et base-toi uniquement sur le document.
+            """
+
+METRICS_SCHEMA = {
+    'periode': str,
+    'date_cloture': str,
+    'devise': str,
+    'chiffre_affaires': float,
+    'chiffre_affaires_precedent': float,
+    'variation_ca_pct': float,
+    'resultat_net': float,
+    'resultat_net_precedent': float,
+    'variation_rn_pct': float,
+    'dividende_par_action': float,
+    'synthese': str,
+}
+
+METRICS_DB_PATH = os.environ.get('BRVM_METRICS_DB', 'metriques_brvm.sqlite')
+
+# Mode lot (--batch) : plusieurs rapports d'une même société dans une seule requête,
+# avec une réponse JSON par document.
+PROMPT_LOT = """
+            Les {count} documents ci-dessous sont des rapports financiers distincts de la même société, chacun précédé
+            de son numéro et de son titre. Applique les consignes précédentes à CHAQUE document séparément, sans mélanger
+            leurs chiffres, et réponds UNIQUEMENT par un tableau JSON de {count} objets, dans l'ordre des documents,
+            chacun avec la clé "document" (numéro du document) et {reponse}.
+            """
+PROMPT_LOT_REPONSE_TEXTE = 'la clé "analyse" (ta synthèse du document, structurée en points clés)'
+PROMPT_LOT_REPONSE_JSON = "les clés de l'objet JSON demandé"
+
+PROMPT_EXTRAIT_TEXTE = """
+            Le document n'est pas joint en PDF : seul le texte de ses pages financières (compte de résultat, bilan,
+            dividende) est fourni ci-dessous, page par page. Les tableaux peuvent avoir perdu leur mise en forme.
+            """
+
+# Quota de l'API Gemini (requêtes generate_content par minute) et nombre de
+# rapports traités simultanément (téléchargement, envoi et génération).
+GEMINI_REQUESTS_PER_MINUTE = 15
+ANALYSIS_WORKERS = 4
+
+# Taille maximale d'un lot en mode --batch : au-delà, ou si le modèle signale un
+# dépassement de contexte, le lot est scindé.
+BATCH_MAX_DOCUMENTS = 6
+BATCH_MAX_BYTES = 30 * 1024 * 1024
+
+# Collecte des rapports : 'http' (requêtes directes, pages rendues côté serveur),
+# 'selenium' (navigateur headless) ou 'auto' (HTTP, puis Selenium en secours).
+BRVM_BASE_URL = "https://www.brvm.org"
+SCRAPER_MODE = 'auto'
+CRAWL_WORKERS = 8
+LISTING_MAX_PAGES = 5
+
+# Collecte Selenium (secours) : selenium simple, sauf si l'interception des requêtes
+# (selenium-wire) est demandée ; images, CSS et polices bloquées, chargement 'eager'.
+SELENIUM_WIRE = False
+SELENIUM_WAIT_SECONDS = 15
+SELENIUM_BLOCKED_URLS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.ico',
+                         '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+
+# Sélection des rapports à analyser : une règle retient un rapport si tous ses critères
+# sont satisfaits (annee_min, annee_max, periodes, types, certifie) ; un rapport est
+# analysé si au moins une règle le retient. Remplaçables par --selection-rules (JSON).
+REPORT_SELECTION_RULES = [
+    # Exercice 2024 : états financiers, rapports annuels et des commissaires aux comptes, ou rapports certifiés.
+    {'annee_min': 2024, 'annee_max': 2024, 'types': ['etats_financiers', 'rapport_annuel', 'rapport_commissaires']},
+    {'annee_min': 2024, 'annee_max': 2024, 'certifie': True},
+    # Tous les rapports à partir de 2025.
+    {'annee_min': 2025},
+]
+# Types périodiques pour lesquels une seule publication par (exercice, période, type, variante)
+# est analysée ; en cas de republication, la version certifiée l'emporte.
+DEDUP_REPORT_TYPES = {'etats_financiers', 'rapport_annuel', 'rapport_commissaires', 'rapport_activite'}
+
+# État de la collecte (validateurs HTTP des pages, rapports déjà vus) conservé
+# d'un passage à l'autre pour les requêtes conditionnelles et le mode incrémental.
+CRAWL_STATE_PATH = os.environ.get('BRVM_CRAWL_STATE', 'crawl_state.json')
+# À incrémenter quand le format des pages mémorisées change : les anciennes sont alors ignorées.
+CRAWL_STATE_VERSION = 2
+
+# Téléchargement des PDF : lecture par blocs vers un fichier temporaire propre
+# à chaque rapport, avec une taille minimale et un plafond dur.
+PDF_MIN_BYTES = 1024
+PDF_MAX_BYTES = 50 * 1024 * 1024
+PDF_CHUNK_BYTES = 64 * 1024
+
+# Pré-sélection locale des pages (pypdf) : 'off' envoie le PDF complet, 'pages'
+# un PDF réduit aux pages financières, 'text' uniquement leur texte extrait.
+PAGE_SELECTION_MODE = 'off'
+PAGE_SELECTION_MAX_PAGES = 12
+PAGE_SELECTION_MIN_CHARS = 200
+PAGE_KEYWORDS = [
+    "chiffre d'affaires", 'resultat net', 'dividende', 'etats financiers', 'bilan',
+    'compte de resultat', 'resultat d exploitation', 'activites ordinaires',
+    'produit net bancaire', 'capitaux propres', 'total actif', 'commissaires aux comptes',
+]
+
+# Synchronisation vers Google Sheets : bloc dédié dans l'onglet de chaque symbole,
+# à partir de SHEET_SYNC_ANCHOR_COLUMN, pour ne jamais écraser les données existantes.
+SHEET_SYNC_ANCHOR_COLUMN = 'AA'
+SHEET_SYNC_HEADERS = ['Date', 'Titre du rapport', 'URL', "Synthèse de l'analyse IA",
+                      "Chiffre d'affaires", 'Variation CA (%)', 'Résultat net', 'Variation RN (%)', 'Dividende par action']
+SHEET_SYNC_MAX_CALLS = 20
+SHEET_SYNC_RANGES_PER_CALL = 500
+SHEET_CELL_MAX_CHARS = 49000
+
+# Journal des analyses terminées (JSONL, une ligne par rapport), base de la reprise
+# après interruption (--resume) et de la reconstruction hors ligne du rapport Word.
+JOURNAL_PATH = os.environ.get('BRVM_JOURNAL', 'journal_analyses.jsonl')
+
+# Exécution répartie (--shard i/N) : chaque partition écrit ses résultats partiels
+# dans SHARD_RESULTS_PATTERN ; --merge-shards les réunit en un seul rapport Word.
+SHARD_RESULTS_PATTERN = 'resultats_partition_{index}_sur_{count}.json'
+
+# Formats du rapport final, écrit société par société pendant l'analyse : 'docx'
+# (toujours produit par défaut), 'md' et 'html' pour une consultation rapide.
+REPORT_FORMATS = ['docx']
+
+# Mesures de performance écrites en fin de run (JSON, et textfile Prometheus en option).
+RUN_METRICS_DIR = os.environ.get('BRVM_METRICS_DIR', '.')
+
+# Reprises sur erreur transitoire (téléchargements, envoi et génération Gemini).
+MAX_ATTEMPTS = 4
+
+CACHE_DB_PATH = os.environ.get('BRVM_CACHE_DB', 'cache_analyses.sqlite')
+CACHE_TTL_DAYS = 90
+CACHE_MAX_ENTRIES = 5000
+
+class PDFRejectedError(Exception):
+    """PDF refusé avant analyse (introuvable, vide, tronqué ou trop volumineux) ; le message est repris dans le rapport."""
+
+# ------------------------------------------------------------------------------
+# 4. NORMALISATION DES NOMS ET RECONNAISSANCE DES SYMBOLES
+# ------------------------------------------------------------------------------
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9\s\.]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=8192)
+def normalize_text(text):
+    if not text: return ""
+    text = text.replace('-', ' ')
+    text = ''.join(c for c in unicodedata.normalize('NFD', str(text).lower()) if unicodedata.category(c) != 'Mn')
+    text = _NON_ALNUM_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+class SymbolMatcher:
+    """Associe un nom de société normalisé à son symbole en une seule passe (automate d'Aho-Corasick).
+
+    L'automate est construit une fois à partir de toutes les alternatives normalisées ;
+    chaque nom est ensuite parcouru caractère par caractère, quel que soit le nombre
+    d'émetteurs. La correspondance la plus longue l'emporte (ex. 'fctc sonatel' avant
+    'sonatel'), puis la plus à gauche.
+    """
+
+    def __init__(self, societes_mapping):
+        self.symbol_by_alternative = {}
+        for symbol, info in societes_mapping.items():
+            for alt in info['alternatives']:
+                self.symbol_by_alternative.setdefault(normalize_text(alt), symbol)
+
+        # Trie : transitions par nœud, et alternative se terminant exactement sur le nœud.
+        self._goto = [{}]
+        terminal = [None]
+        for alt in self.symbol_by_alternative:
+            node = 0
+            for char in alt:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    terminal.append(None)
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            terminal[node] = alt
+
+        # Liens d'échec (parcours en largeur) ; self._longest[n] est la plus longue
+        # alternative qui se termine au nœud n, y compris via ses suffixes.
+        self._fail = [0] * len(self._goto)
+        self._longest = list(terminal)
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if self._longest[child] is None:
+                    self._longest[child] = self._longest[self._fail[child]]
+
+    def match(self, company_name_normalized):
+        goto, fail, longest = self._goto, self._fail, self._longest
+        best = None
+        node = 0
+        for char in company_name_normalized:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = longest[node]
+            if found and (best is None or len(found) > len(best)):
+                best = found
+        return self.symbol_by_alternative[best] if best else None
+
+# ------------------------------------------------------------------------------
+# 5. PRÉ-SÉLECTION LOCALE DES PAGES FINANCIÈRES
+# ------------------------------------------------------------------------------
+def select_financial_pages(pdf_path, max_pages=PAGE_SELECTION_MAX_PAGES):
+    """Extrait le texte de chaque page et retient les plus riches en mots-clés financiers.
+
+    Retourne la liste (numéro de page, texte) dans l'ordre du document, ou None
+    quand la pré-sélection est impossible (pypdf absent, PDF scanné sans texte,
+    aucune page pertinente) : l'appelant envoie alors le document complet.
+    """
+    if PdfReader is None:
+        return None
+    reader = PdfReader(pdf_path)
+    scored_pages = []
+    total_chars = 0
+    for page_num, page in enumerate(reader.pages):
+        text = page.extract_text() or ""
+        total_chars += len(text)
+        # Pas de cache LRU ici : le texte d'une page ne sert qu'une fois.
+        normalized = normalize_text.__wrapped__(text)
+        score = sum(normalized.count(normalize_text(keyword)) for keyword in PAGE_KEYWORDS)
+        if score:
+            scored_pages.append((score, page_num, text))
+    if total_chars < PAGE_SELECTION_MIN_CHARS or not scored_pages:
+        return None
+    best_pages = sorted(scored_pages, key=lambda p: (-p[0], p[1]))[:max_pages]
+    return [(page_num, text) for _, page_num, text in sorted(best_pages, key=lambda p: p[1])]
+
+def write_pdf_pages(pdf_path, page_numbers):
+    """Écrit un PDF temporaire ne contenant que les pages demandées et retourne son chemin."""
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page_num in page_numbers:
+        writer.add_page(reader.pages[page_num])
+    with tempfile.NamedTemporaryFile(prefix='brvm_pages_', suffix='.pdf', delete=False) as f:
+        writer.write(f)
+        return f.name
+
+# ------------------------------------------------------------------------------
+# 6. EXTRACTION STRUCTURÉE DES MÉTRIQUES FINANCIÈRES
+# ------------------------------------------------------------------------------
+def validate_metrics(data):
+    """Valide la réponse JSON du modèle contre METRICS_SCHEMA et retourne un dict normalisé.
+
+    Lève ValueError si la réponse n'est pas exploitable.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("la réponse structurée n'est pas un objet JSON")
+    metrics = {}
+    for field, expected_type in METRICS_SCHEMA.items():
+        value = data.get(field)
+        if value is None or value == "":
+            metrics[field] = None
+        elif expected_type is float:
+            if isinstance(value, str):
+                value = value.replace('\u202f', '').replace('\xa0', '').replace(' ', '').replace('%', '').replace(',', '.')
+            try:
+                metrics[field] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"champ '{field}' non numérique : {value!r}")
+        else:
+            metrics[field] = str(value).strip()
+    if metrics['date_cloture']:
+        try:
+            datetime.strptime(metrics['date_cloture'], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"champ 'date_cloture' invalide : {metrics['date_cloture']!r}")
+    return metrics
+
+def format_metrics(metrics):
+    """Met en forme les métriques extraites pour la colonne d'analyse du rapport Word."""
+    devise = metrics.get('devise') or ''
+
+    def amount(value):
+        return f"{value:,.0f} {devise}".replace(',', ' ').strip() if value is not None else "n.d."
+
+    def pct(value):
+        return f"{value:+.1f} %" if value is not None else "n.d."
+
+    lines = [
+        f"Période : {metrics.get('periode') or 'n.d.'}",
+        f"Chiffre d'affaires : {amount(metrics['chiffre_affaires'])} ({pct(metrics['variation_ca_pct'])})",
+        f"Résultat net : {amount(metrics['resultat_net'])} ({pct(metrics['variation_rn_pct'])})",
+        f"Dividende par action : {amount(metrics['dividende_par_action'])}",
+    ]
+    if metrics.get('synthese'):
+        lines.append("")
+        lines.append(metrics['synthese'])
+    return "\n".join(lines)
+
+class MetricsStore:
+    """Table SQLite des métriques extraites, une ligne par (symbole, date du rapport, URL).
+
+    Les comparaisons entre sociétés ou entre périodes se font en SQL, sans relire de PDF.
+    """
+
+    def __init__(self, db_path=METRICS_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        columns = ", ".join(
+            f"{field} {'REAL' if expected_type is float else 'TEXT'}" for field, expected_type in METRICS_SCHEMA.items()
+        )
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS metriques (
+                symbole TEXT NOT NULL,
+                date_rapport TEXT NOT NULL,
+                url TEXT NOT NULL,
+                titre TEXT,
+                {columns},
+                extrait_le TEXT NOT NULL,
+                PRIMARY KEY (symbole, date_rapport, url)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_metriques_date ON metriques (date_rapport)")
+        self._conn.commit()
+
+    def upsert(self, symbol, report_date, url, titre, metrics):
+        fields = list(METRICS_SCHEMA)
+        placeholders = ", ".join("?" for _ in range(len(fields) + 5))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO metriques (symbole, date_rapport, url, titre, {', '.join(fields)}, extrait_le) "
+                f"VALUES ({placeholders})",
+                [symbol, report_date, url, titre] + [metrics[f] for f in fields] + [datetime.now().isoformat(timespec='seconds')]
+            )
+            self._conn.commit()
+
+    def latest_by_symbol(self):
+        """Dernières métriques connues de chaque société, pour les écrans multi-sociétés."""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT m.* FROM metriques m
+                JOIN (SELECT symbole, MAX(date_rapport) AS date_rapport FROM metriques GROUP BY symbole) last
+                  ON m.symbole = last.symbole AND m.date_rapport = last.date_rapport
+                ORDER BY m.symbole
+            """).fetchall()
+        return [dict(row) for row in rows]
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ------------------------------------------------------------------------------
+# 7. SYNCHRONISATION DES RÉSULTATS VERS GOOGLE SHEETS
+# ------------------------------------------------------------------------------
+class SheetSync:
+    """Écrit les rapports analysés dans l'onglet de chaque symbole, par appels groupés.
+
+    Une lecture groupée (values_batch_get) récupère le bloc existant de tous les
+    onglets, puis seules les lignes nouvelles ou modifiées sont réécrites via
+    values_batch_update. Les onglets trop étroits pour le bloc (26 colonnes par
+    défaut) sont d'abord élargis en un seul batch_update. Le nombre d'appels par
+    run est plafonné et les erreurs de quota (429) sont réessayées avec un délai
+    exponentiel.
+    """
+
+    def __init__(self, spreadsheet, anchor_column=SHEET_SYNC_ANCHOR_COLUMN, max_calls=SHEET_SYNC_MAX_CALLS,
+                 worksheets=None):
+        self.spreadsheet = spreadsheet
+        # Onglets déjà listés par l'appelant ({titre: Worksheet}) ; sinon relus via l'API.
+        self.worksheets = worksheets
+        self.anchor_index = gspread.utils.column_letter_to_index(anchor_column)
+        self.last_index = self.anchor_index + len(SHEET_SYNC_HEADERS) - 1
+        self.last_column = gspread.utils.rowcol_to_a1(1, self.last_index).rstrip('0123456789')
+        self.anchor_column = anchor_column
+        self.max_calls = max_calls
+        self.calls = 0
+
+    def _call(self, func, *args, max_attempts=5, **kwargs):
+        if self.calls >= self.max_calls:
+            raise RuntimeError(f"plafond de {self.max_calls} appels à l'API Sheets atteint")
+        for attempt in range(max_attempts):
+            self.calls += 1
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                status = e.response.status_code if getattr(e, 'response', None) is not None else None
+                if status not in (429, 500, 503) or attempt == max_attempts - 1 or self.calls >= self.max_calls:
+                    raise
+                delay = 2 ** attempt * 5
+                logger.warning(f"⚠️ Quota Google Sheets atteint (HTTP {status}). Nouvel essai dans {delay} s...")
+                time.sleep(delay)
+
+    def _ensure_columns(self, symbols):
+        """Élargit les onglets qui s'arrêtent avant la dernière colonne du bloc.
+
+        Une plage hors de la grille est refusée (HTTP 400 « exceeds grid limits ») et ferait
+        échouer la lecture groupée de tous les onglets.
+        """
+        worksheets = self.worksheets
+        if worksheets is None:
+            worksheets = {ws.title: ws for ws in self._call(self.spreadsheet.worksheets)}
+        requests_body = []
+        for symbol in symbols:
+            ws = worksheets.get(symbol)
+            if ws is not None and ws.col_count < self.last_index:
+                requests_body.append({'appendDimension': {
+                    'sheetId': ws.id, 'dimension': 'COLUMNS', 'length': self.last_index - ws.col_count,
+                }})
+        if not requests_body:
+            return 0
+        self._call(self.spreadsheet.batch_update, {'requests': requests_body})
+        logger.info(f"Google Sheets : {len(requests_body)} onglet(s) élargi(s) jusqu'à la colonne {self.last_column}.")
+        return len(requests_body)
+
+    def _block_range(self, symbol, first_row=1, last_row=None):
+        return f"'{symbol}'!{self.anchor_column}{first_row}:{self.last_column}{last_row or ''}"
+
+    @staticmethod
+    def _row_values(rapport):
+        metrics = rapport.get('metriques') or {}
+
+        def cell(value):
+            return "" if value is None else value
+
+        return [
+            rapport['date'],
+            rapport['titre'],
+            rapport['url'],
+            rapport.get('analyse_ia', '')[:SHEET_CELL_MAX_CHARS],
+            cell(metrics.get('chiffre_affaires')),
+            cell(metrics.get('variation_ca_pct')),
+            cell(metrics.get('resultat_net')),
+            cell(metrics.get('variation_rn_pct')),
+            cell(metrics.get('dividende_par_action')),
+        ]
+
+    @staticmethod
+    def _same_cell(sheet_value, value):
+        # La feuille renvoie 1000 pour 1000.0 : les nombres sont comparés numériquement.
+        if isinstance(value, float) and isinstance(sheet_value, (int, float)):
+            return float(sheet_value) == value
+        return str(sheet_value) == str(value)
+
+    def sync(self, results):
+        analysed = {
+            symbol: [r for r in data.get('rapports_analyses', []) if not r.get('a_reessayer')]
+            for symbol, data in results.items()
+        }
+        symbols = [symbol for symbol, rapports in analysed.items() if rapports]
+        if not symbols:
+            logger.info("Google Sheets : aucun rapport analysé à synchroniser.")
+            return 0
+
+        self._ensure_columns(symbols)
+        response = self._call(self.spreadsheet.values_batch_get, [self._block_range(symbol) for symbol in symbols],
+                              params={'valueRenderOption': 'UNFORMATTED_VALUE'})
+        existing_blocks = [value_range.get('values', []) for value_range in response.get('valueRanges', [])]
+
+        data = []
+        for symbol, existing in zip(symbols, existing_blocks):
+            if not existing or existing[0] != SHEET_SYNC_HEADERS:
+                data.append({'range': self._block_range(symbol, 1, 1), 'values': [SHEET_SYNC_HEADERS]})
+            row_by_url = {row[2]: (row_num, row) for row_num, row in enumerate(existing[1:], start=2) if len(row) > 2}
+            next_row = max(len(existing) + 1, 2)
+            for rapport in analysed[symbol]:
+                values = self._row_values(rapport)
+                if rapport['url'] in row_by_url:
+                    row_num, current = row_by_url[rapport['url']]
+                    current = current + [''] * (len(values) - len(current))
+                    if all(self._same_cell(a, b) for a, b in zip(current, values)):
+                        continue
+                else:
+                    row_num = next_row
+                    next_row += 1
+                data.append({'range': self._block_range(symbol, row_num, row_num), 'values': [values]})
+
+        if not data:
+            logger.info("✅ Google Sheets déjà à jour : aucune ligne modifiée.")
+            return 0
+        for start in range(0, len(data), SHEET_SYNC_RANGES_PER_CALL):
+            self._call(self.spreadsheet.values_batch_update, {
+                'valueInputOption': 'RAW',
+                'data': data[start:start + SHEET_SYNC_RANGES_PER_CALL],
+            })
+        logger.info(f"✅ Google Sheets : {len(data)} ligne(s) écrite(s) sur {len(symbols)} onglet(s) en {self.calls} appel(s).")
+        return len(data)
+
+# ------------------------------------------------------------------------------
+# 8. JOURNAL DES ANALYSES (REPRISE APRÈS INTERRUPTION)
+# ------------------------------------------------------------------------------
+class AnalysisJournal:
+    """Journal JSONL en ajout seul : chaque analyse est écrite et synchronisée sur disque dès qu'elle se termine.
+
+    Sans reprise, un nouveau run repart d'un journal vide. Avec `resume=True`, les
+    entrées existantes sont rechargées et les rapports correspondants ne sont pas ré-analysés.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if resume:
+            for entry in self.read_entries(path):
+                if entry.get('type') == 'rapport' and not entry['analyse'].get('a_reessayer'):
+                    self.entries[(entry['symbole'], entry['analyse']['url'])] = entry['analyse']
+            logger.info(f"♻️  Reprise : {len(self.entries)} analyse(s) déjà journalisée(s) dans {path}.")
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    @staticmethod
+    def read_entries(path):
+        entries = []
+        if not os.path.exists(path):
+            return entries
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée si le processus a été tué pendant l'écriture.
+                    continue
+        return entries
+
+    @classmethod
+    def read_results(cls, path, societes_mapping):
+        """Reconstruit le dict `results` de process_all_companies à partir du seul journal."""
+        results = {}
+        for entry in cls.read_entries(path):
+            data = results.setdefault(entry['symbole'], {'nom': entry['nom'], 'rapports_analyses': []})
+            if entry.get('type') == 'rapport':
+                data['rapports_analyses'] = [r for r in data['rapports_analyses'] if r['url'] != entry['analyse']['url']]
+                data['rapports_analyses'].append(entry['analyse'])
+            elif entry.get('type') == 'statut':
+                data['statut'] = entry['statut']
+        for data in results.values():
+            data['rapports_analyses'].sort(key=lambda r: r['date'], reverse=True)
+        ordered = {symbol: results.pop(symbol) for symbol in societes_mapping if symbol in results}
+        ordered.update(results)
+        return ordered
+
+    def get(self, symbol, url):
+        return self.entries.get((symbol, url))
+
+    def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record_report(self, symbol, nom, analysis):
+        self._append({'type': 'rapport', 'symbole': symbol, 'nom': nom, 'analyse': analysis,
+                      'journalise_le': datetime.now().isoformat(timespec='seconds')})
+
+    def record_status(self, symbol, nom, statut):
+        self._append({'type': 'statut', 'symbole': symbol, 'nom': nom, 'statut': statut})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# ------------------------------------------------------------------------------
+# 9. CACHE PERSISTANT DES ANALYSES (SQLITE)
+# ------------------------------------------------------------------------------
+class AnalysisCache:
+    """Cache disque des analyses IA, adressé par le contenu du PDF.
+
+    La clé combine l'URL du rapport, le SHA-256 des octets du PDF, le modèle
+    et la version du prompt : un rapport inchangé n'est jamais renvoyé à Gemini,
+    tandis qu'un PDF republié sous la même URL est bien ré-analysé.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, ttl_days=CACHE_TTL_DAYS, max_entries=CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                cle TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                pdf_sha256 TEXT NOT NULL,
+                version TEXT NOT NULL,
+                analyse_ia TEXT NOT NULL,
+                cree_le REAL NOT NULL,
+                dernier_acces REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url, pdf_sha256, version):
+        return hashlib.sha256(f"{url}|{pdf_sha256}|{version}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT analyse_ia, cree_le FROM analyses WHERE cle = ?", (key,)).fetchone()
+            if not row:
+                return None
+            analyse_ia, cree_le = row
+            now = time.time()
+            if self.ttl_seconds and now - cree_le > self.ttl_seconds:
+                self._conn.execute("DELETE FROM analyses WHERE cle = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE analyses SET dernier_acces = ? WHERE cle = ?", (now, key))
+            self._conn.commit()
+            return analyse_ia
+
+    def set(self, key, url, pdf_sha256, version, analyse_ia):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (cle, url, pdf_sha256, version, analyse_ia, cree_le, dernier_acces) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, pdf_sha256, version, analyse_ia, now, now)
+            )
+            self._conn.commit()
+
+    def evict(self):
+        """Supprime les entrées expirées puis les moins récemment utilisées au-delà de max_entries."""
+        with self._lock:
+            expired = 0
+            if self.ttl_seconds:
+                expired = self._conn.execute(
+                    "DELETE FROM analyses WHERE cree_le < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+            overflow = 0
+            if self.max_entries:
+                overflow = self._conn.execute(
+                    "DELETE FROM analyses WHERE cle IN ("
+                    "SELECT cle FROM analyses ORDER BY dernier_acces DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+        if expired or overflow:
+            logger.info(f"🧹 Cache des analyses : {expired} entrée(s) expirée(s), {overflow} entrée(s) évincée(s).")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ------------------------------------------------------------------------------
+# 10. ÉTAT DE LA COLLECTE (REQUÊTES CONDITIONNELLES ET RAPPORTS DÉJÀ VUS)
+# ------------------------------------------------------------------------------
+class CrawlState:
+    """État persistant du crawl, stocké en JSON.
+
+    Pour chaque page (liste ou société) : ETag / Last-Modified renvoyés par le
+    serveur et les données brutes qui en sont extraites, réutilisées sur une réponse 304.
+    Les lignes de liste sont conservées telles quelles (texte du lien, href) : les symboles
+    sont reconnus à chaque passage, avec le mapping courant.
+    Pour chaque symbole : les URLs de rapports déjà traitées lors des passages précédents.
+    """
+
+    def __init__(self, path=CRAWL_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.pages = {}
+        self.seen_reports = {}
+        self.not_modified_count = 0
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == CRAWL_STATE_VERSION:
+                    self.pages = data.get('pages', {})
+                else:
+                    logger.info("État de collecte d'un format antérieur : pages relues intégralement.")
+                self.seen_reports = {symbol: set(urls) for symbol, urls in data.get('seen_reports', {}).items()}
+                logger.info(f"✅ État de collecte chargé : {len(self.pages)} page(s), {sum(len(u) for u in self.seen_reports.values())} rapport(s) déjà vus.")
+            except Exception as e:
+                logger.warning(f"⚠️ État de collecte illisible ({path}), collecte complète : {e}")
+
+    def conditional_headers(self, url):
+        page = self.pages.get(url)
+        if not page:
+            return {}
+        headers = {}
+        if page.get('etag'):
+            headers['If-None-Match'] = page['etag']
+        if page.get('last_modified'):
+            headers['If-Modified-Since'] = page['last_modified']
+        return headers
+
+    def get_payload(self, url):
+        with self._lock:
+            payload = self.pages.get(url, {}).get('payload')
+            if payload is not None:
+                self.not_modified_count += 1
+            return payload
+
+    def store_page(self, url, response_headers, payload):
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        with self._lock:
+            if etag or last_modified:
+                self.pages[url] = {'etag': etag, 'last_modified': last_modified, 'payload': payload}
+            else:
+                self.pages.pop(url, None)
+
+    def is_new_report(self, symbol, url):
+        return url not in self.seen_reports.get(symbol, set())
+
+    def mark_seen(self, symbol, urls):
+        with self._lock:
+            self.seen_reports.setdefault(symbol, set()).update(urls)
+
+    def save(self):
+        with self._lock:
+            data = {
+                'version': CRAWL_STATE_VERSION,
+                'pages': self.pages,
+                'seen_reports': {symbol: sorted(urls) for symbol, urls in self.seen_reports.items()},
+            }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+# ------------------------------------------------------------------------------
+# 11. LIMITEUR DE DÉBIT (TOKEN BUCKET)
+# ------------------------------------------------------------------------------
+class RateLimiter:
+    """Token bucket partagé entre les workers : `acquire()` bloque jusqu'à ce qu'un jeton soit disponible."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        if rate_per_minute <= 0:
+            raise ValueError(f"quota de requêtes par minute invalide : {rate_per_minute} (doit être > 0)")
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate_per_second)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
+
+# ------------------------------------------------------------------------------
+# 12. INSTRUMENTATION (CHRONOMÈTRES ET COMPTEURS PAR ÉTAPE)
+# ------------------------------------------------------------------------------
+class RunMetrics:
+    """Chronomètres et compteurs d'un run, partagés entre les threads.
+
+    `with metrics.stage('gemini_generate'):` mesure une étape ; `metrics.incr('pdf_bytes', n)`
+    alimente un compteur. `summary()` donne nombre, total, p50, p95 et max par étape.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.durations = defaultdict(list)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, elapsed):
+        """Ajoute une durée mesurée hors d'un bloc `with` (ex. pages chargées en parallèle)."""
+        with self._lock:
+            self.durations[name].append(elapsed)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    @staticmethod
+    def _percentile(sorted_values, pct):
+        # Méthode du rang le plus proche.
+        index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+        return sorted_values[index]
+
+    def summary(self):
+        with self._lock:
+            stages = {}
+            for name, values in self.durations.items():
+                ordered = sorted(values)
+                stages[name] = {
+                    'count': len(ordered),
+                    'total_s': round(sum(ordered), 3),
+                    'p50_s': round(self._percentile(ordered, 50), 3),
+                    'p95_s': round(self._percentile(ordered, 95), 3),
+                    'max_s': round(ordered[-1], 3),
+                }
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'wall_time_s': round(time.perf_counter() - self._start, 3),
+                'stages': stages,
+                'counters': dict(self.counters),
+            }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, path):
+        """Format textfile du node_exporter ; écriture atomique pour ne jamais exposer un fichier partiel."""
+        summary = self.summary()
+        lines = [
+            "# TYPE brvm_run_wall_time_seconds gauge",
+            f"brvm_run_wall_time_seconds {summary['wall_time_s']}",
+            "# TYPE brvm_stage_duration_seconds summary",
+        ]
+        for name, stats in sorted(summary['stages'].items()):
+            lines.append(f'brvm_stage_duration_seconds{{stage="{name}",quantile="0.5"}} {stats["p50_s"]}')
+            lines.append(f'brvm_stage_duration_seconds{{stage="{name}",quantile="0.95"}} {stats["p95_s"]}')
+            lines.append(f'brvm_stage_duration_seconds_sum{{stage="{name}"}} {stats["total_s"]}')
+            lines.append(f'brvm_stage_duration_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines.append("# TYPE brvm_run_counter gauge")
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f'brvm_run_counter{{name="{name}"}} {value}')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(f"⏱️  Durée totale : {summary['wall_time_s']} s")
+        for name, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['total_s']):
+            logger.info(f"    {name:<22} n={stats['count']:<5} total={stats['total_s']:>9.2f} s  "
+                        f"p50={stats['p50_s']:.2f} s  p95={stats['p95_s']:.2f} s")
+        for name, value in sorted(summary['counters'].items()):
+            logger.info(f"    {name:<22} {value}")
+
+# ------------------------------------------------------------------------------
+# 13. REPRISES SUR ERREUR ET DISJONCTEUR (TÉLÉCHARGEMENTS ET APPELS GEMINI)
+# ------------------------------------------------------------------------------
+class AnalysisFailedError(Exception):
+    """Échec technique de l'analyse d'un rapport : le rapport est marqué « à réessayer », pas analysé."""
+
+class CircuitOpenError(AnalysisFailedError):
+    """Le disjoncteur est ouvert : l'appel n'est pas tenté."""
+
+TRANSIENT_HTTP_STATUSES = {408, 429, 500, 502, 503, 504}
+# Document retiré du site : erreur définitive, le rapport n'est pas remis « à réessayer ».
+MISSING_HTTP_STATUSES = {404, 410}
+
+def _error_status(error):
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None and isinstance(getattr(error, 'code', None), int):
+        status = error.code  # google.api_core.exceptions.GoogleAPICallError
+    return status
+
+def is_transient_error(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return _error_status(error) in TRANSIENT_HTTP_STATUSES
+
+def is_client_error(error):
+    """Requête refusée par le serveur (4xx non transitoire) : ne dit rien de l'état du service."""
+    status = _error_status(error)
+    return status is not None and 400 <= status < 500 and status not in TRANSIENT_HTTP_STATUSES
+
+def is_context_limit_error(error):
+    """Requête refusée car trop longue pour la fenêtre de contexte du modèle (400, nombre de jetons dépassé)."""
+    message = str(error).lower()
+    return _error_status(error) == 400 and ('token' in message or 'context' in message)
+
+def retry_after_seconds(error):
+    """Délai demandé par le serveur (en-tête Retry-After, en secondes ou en date HTTP), sinon None."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if not value:
+        return None
+    if str(value).strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """Disjoncteur sur fenêtre glissante : ouvert quand le taux d'échec dépasse le seuil.
+
+    Ouvert, il refuse les appels pendant `cooldown` secondes (les rapports restants
+    échouent immédiatement et restent à réessayer), puis laisse passer un appel
+    d'essai : un succès le referme, un échec le rouvre. Un essai sans verdict
+    (PDF refusé, requête rejetée en 4xx) est libéré par `release` : l'appel
+    suivant sert de nouvel essai.
+    """
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=6, cooldown=120):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._trial_owner = None  # thread qui porte l'appel d'essai
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_owner is None and time.monotonic() - self._opened_at >= self.cooldown:
+                self._trial_owner = threading.get_ident()
+                logger.info(f"🔌 Disjoncteur {self.name} : appel d'essai après {self.cooldown} s de pause.")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                # Les échecs de la panne ne comptent plus une fois le service rétabli.
+                self._outcomes.clear()
+                logger.info(f"✅ Disjoncteur {self.name} refermé.")
+            self._outcomes.append(True)
+            self._opened_at = None
+            self._trial_owner = None
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            is_trial = self._trial_owner == threading.get_ident()
+            if is_trial or (
+                self._opened_at is None
+                and len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.failure_rate
+            ):
+                logger.error(f"🔌 Disjoncteur {self.name} ouvert ({failures}/{len(self._outcomes)} échecs récents). "
+                             f"Appels suspendus {self.cooldown} s.")
+                self._opened_at = time.monotonic()
+                self._trial_owner = None
+
+    def release(self):
+        """Termine l'appel d'essai du thread courant sans verdict (sans effet hors essai)."""
+        with self._lock:
+            if self._trial_owner == threading.get_ident():
+                self._trial_owner = None
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+class RetryPolicy:
+    """Réessaie les erreurs transitoires (réseau, 408/429/5xx) avec un délai exponentiel à gigue complète.
+
+    L'en-tête Retry-After, s'il est présent, l'emporte sur le délai calculé (dans la limite de max_delay).
+    """
+
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay_for(self, attempt, error):
+        requested = retry_after_seconds(error)
+        if requested is not None:
+            return min(requested, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, func, description, breaker=None):
+        for attempt in range(self.max_attempts):
+            if breaker and not breaker.allow():
+                raise CircuitOpenError(f"{description} non tenté : disjoncteur {breaker.name} ouvert.")
+            try:
+                result = func()
+            except PDFRejectedError:
+                raise
+            except Exception as e:
+                # Une requête refusée (400 trop longue, 404 introuvable...) ne dit rien de l'état du service.
+                if breaker and not is_client_error(e):
+                    breaker.record_failure()
+                if not is_transient_error(e) or attempt == self.max_attempts - 1:
+                    raise
+                delay = self.delay_for(attempt, e)
+                logger.warning(f"    -> {description} : erreur transitoire ({e}). "
+                               f"Nouvel essai {attempt + 2}/{self.max_attempts} dans {delay:.1f} s.")
+                time.sleep(delay)
+            else:
+                if breaker:
+                    breaker.record_success()
+                return result
+            finally:
+                # Un essai sans verdict ne doit pas laisser le disjoncteur bloqué.
+                if breaker:
+                    breaker.release()
+
+# ------------------------------------------------------------------------------
+# 14. EXÉCUTION RÉPARTIE (PARTITIONS DE SOCIÉTÉS ET FUSION DES RÉSULTATS)
+# ------------------------------------------------------------------------------
+def parse_shard(value):
+    """Convertit « i/N » (1 <= i <= N) en tuple (i, N) ; utilisé comme type argparse."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', value or '')
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"partition invalide : {value!r} (attendu i/N avec 1 <= i <= N)")
+    return int(match.group(1)), int(match.group(2))
+
+def assign_shards(symbols, shard_count):
+    """Associe chaque symbole à une partition (1 à shard_count).
+
+    Les symboles sont classés par hachage SHA-1, stable d'un run et d'une machine à l'autre
+    (contrairement à hash()) et indépendant de l'ordre du mapping, puis distribués à tour de
+    rôle : les partitions ont le même nombre de sociétés à une près, ce qu'un simple modulo
+    du hachage ne garantit pas sur 47 symboles.
+    """
+    ranked = sorted(symbols, key=lambda symbol: hashlib.sha1(symbol.encode('utf-8')).hexdigest())
+    return {symbol: rank % shard_count + 1 for rank, symbol in enumerate(ranked)}
+
+def write_shard_results(path, shard, results):
+    index, count = shard
+    data = {
+        'partition': {'index': index, 'total': count},
+        'genere_le': datetime.now().isoformat(timespec='seconds'),
+        'resultats': results,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def merge_shard_results(paths, societes_mapping):
+    """Fusionne les résultats partiels des partitions dans l'ordre du mapping.
+
+    Signale les partitions manquantes ou en double ; un symbole présent dans plusieurs
+    fichiers garde le résultat le plus récent.
+    """
+    partials = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            partials.append(json.load(f))
+    partials.sort(key=lambda data: data.get('genere_le', ''))
+
+    totals = {data['partition']['total'] for data in partials}
+    if len(totals) > 1:
+        logger.warning(f"⚠️ Résultats issus de découpages différents ({sorted(totals)} partitions).")
+    indexes = [data['partition']['index'] for data in partials]
+    for count in totals:
+        missing = sorted(set(range(1, count + 1)) - set(indexes))
+        if missing:
+            logger.warning(f"⚠️ Partition(s) manquante(s) sur {count} : {', '.join(map(str, missing))}. Rapport incomplet.")
+    duplicates = sorted({index for index in indexes if indexes.count(index) > 1})
+    if duplicates:
+        logger.warning(f"⚠️ Partition(s) fournie(s) plusieurs fois : {', '.join(map(str, duplicates))}.")
+
+    results = {}
+    for data in partials:
+        results.update(data['resultats'])
+    ordered = {symbol: results.pop(symbol) for symbol in societes_mapping if symbol in results}
+    ordered.update(results)
+    return ordered
+
+# ------------------------------------------------------------------------------
+# 15. RAPPORTS ÉCRITS AU FIL DE L'EAU (WORD, MARKDOWN, HTML)
+# ------------------------------------------------------------------------------
+REPORT_TITLE = 'Analyse Financière des Sociétés Cotées par IA (Gemini)'
+REPORT_SCOPE = "Ce rapport analyse les états financiers certifiés pour l'année 2024 et tous les rapports publiés à partir de 2025."
+
+def split_report_entries(data):
+    """Sépare les rapports analysés de ceux en échec technique (à réessayer)."""
+    rapports = data.get('rapports_analyses', [])
+    return [r for r in rapports if not r.get('a_reessayer')], [r for r in rapports if r.get('a_reessayer')]
+
+def failed_reports_message(failed):
+    return (f"⚠️ {len(failed)} rapport(s) non analysé(s) suite à une erreur technique, "
+            f"à réessayer au prochain passage : " + " ; ".join(r['titre'] for r in failed))
+
+def empty_section_message(data):
+    status_message = data.get('statut', 'Aucun rapport pertinent n\'a été trouvé.')
+    return f"❌ {status_message}"
+
+class _WordStream:
+    """Document Word construit section par section sans garder le document complet en mémoire.
+
+    Chaque section est rendue dans un Document python-docx de travail, dont le XML est
+    aussitôt ajouté à un fichier temporaire puis retiré du document ; close() assemble le
+    .docx à partir du paquet du modèle par défaut, en recopiant ce XML en flux dans
+    word/document.xml.
+    """
+
+    def __init__(self, path, scope=REPORT_SCOPE):
+        self.path = path
+        self._body = tempfile.NamedTemporaryFile(prefix='brvm_rapport_', suffix='.xml', delete=False)
+        self._fragment = Document()
+        self._write_fragment(self._render_header, scope)
+
+    def _write_fragment(self, render, *args):
+        render(self._fragment, *args)
+        body = self._fragment.element.body
+        sect_pr = body.find(qn('w:sectPr'))
+        body.remove(sect_pr)
+        xml = etree.tostring(body, encoding='utf-8', xml_declaration=False)
+        # Seuls les enfants de <w:body> sont conservés ; les espaces de noms sont ceux du modèle.
+        self._body.write(xml[xml.index(b'>') + 1:xml.rindex(b'</w:body>')])
+        body.clear()
+        body.append(sect_pr)
+
+    @staticmethod
+    def _render_header(doc, scope):
+        doc.add_heading(REPORT_TITLE, 0)
+        doc.add_paragraph(f"Rapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}")
+        doc.add_paragraph(scope)
+
+    @staticmethod
+    def _render_section(doc, symbol, data):
+        doc.add_heading(f"{symbol} - {data['nom']}", level=2)
+
+        analysed, failed = split_report_entries(data)
+        if failed:
+            doc.add_paragraph(failed_reports_message(failed))
+        if not analysed:
+            if not failed:
+                doc.add_paragraph(empty_section_message(data))
+            return
+
+        table = doc.add_table(rows=1, cols=2, style='Table Grid')
+        table.autofit = False
+        table.columns[0].width = Pt(150)
+        table.columns[1].width = Pt(350)
+
+        headers = ['Titre du Rapport / Date de Publication', "Synthèse de l'Analyse par l'IA"]
+        header_cells = table.rows[0].cells
+        header_cells[0].text = headers[0]
+        header_cells[1].text = headers[1]
+
+        for rapport in analysed:
+            row_cells = table.add_row().cells
+            cell_0_p = row_cells[0].paragraphs[0]
+            cell_0_p.add_run(rapport['titre']).bold = True
+            cell_0_p.add_run(f"\n(Date extraite : {rapport['date']})").italic = True
+            row_cells[1].text = rapport.get('analyse_ia', 'Analyse non disponible.')
+
+        doc.add_paragraph()
+
+    def add_section(self, symbol, data):
+        self._write_fragment(self._render_section, symbol, data)
+
+    def close(self):
+        self._body.close()
+        template = io.BytesIO()
+        Document().save(template)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with zipfile.ZipFile(template) as source, \
+                    zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as target:
+                for item in source.infolist():
+                    if item.filename != 'word/document.xml':
+                        target.writestr(item, source.read(item.filename))
+                        continue
+                    document_xml = source.read(item.filename)
+                    # Balise ouvrante de <w:body>, avec ou sans attributs.
+                    body_start = re.search(rb'<w:body\b[^>]*>', document_xml).end()
+                    with target.open('word/document.xml', 'w') as out, open(self._body.name, 'rb') as body:
+                        out.write(document_xml[:body_start])
+                        shutil.copyfileobj(body, out)
+                        out.write(document_xml[body_start:])
+            os.replace(tmp_path, self.path)
+        finally:
+            os.remove(self._body.name)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def abort(self):
+        self._body.close()
+        os.remove(self._body.name)
+
+class _TextStream:
+    """Rapport texte (Markdown ou HTML) écrit ligne à ligne dans un fichier temporaire."""
+
+    def __init__(self, path, scope=REPORT_SCOPE):
+        self.path = path
+        self.scope = scope
+        self._file = open(f"{path}.tmp", 'w', encoding='utf-8')
+        self._file.write(self.header())
+
+    def add_section(self, symbol, data):
+        self._file.write(self.section(symbol, data))
+
+    def close(self):
+        self._file.write(self.footer())
+        self._file.close()
+        os.replace(self._file.name, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._file.name)
+
+class _MarkdownStream(_TextStream):
+    def header(self):
+        return (f"# {REPORT_TITLE}\n\nRapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}\n\n"
+                f"{self.scope}\n\n")
+
+    def section(self, symbol, data):
+        lines = [f"## {symbol} - {data['nom']}", ""]
+        analysed, failed = split_report_entries(data)
+        if failed:
+            lines += [failed_reports_message(failed), ""]
+        if not analysed and not failed:
+            lines += [empty_section_message(data), ""]
+        for rapport in analysed:
+            lines += [f"### {rapport['titre']}", "", f"*Date extraite : {rapport['date']}* — [PDF]({rapport['url']})", "",
+                      rapport.get('analyse_ia', 'Analyse non disponible.'), ""]
+        return "\n".join(lines) + "\n"
+
+    def footer(self):
+        return ""
+
+class _HtmlStream(_TextStream):
+    def header(self):
+        return ("<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\">"
+                f"<title>{html_escape(REPORT_TITLE)}</title><style>"
+                "body{font-family:sans-serif;max-width:60em;margin:auto}"
+                "table{border-collapse:collapse;width:100%}td,th{border:1px solid #999;padding:.4em;vertical-align:top}"
+                "td:first-child{width:30%}.analyse{white-space:pre-wrap}</style></head><body>\n"
+                f"<h1>{html_escape(REPORT_TITLE)}</h1>\n"
+                f"<p>Rapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}</p>\n<p>{html_escape(self.scope)}</p>\n")
+
+    def section(self, symbol, data):
+        parts = [f"<h2>{html_escape(symbol)} - {html_escape(data['nom'])}</h2>"]
+        analysed, failed = split_report_entries(data)
+        if failed:
+            parts.append(f"<p>{html_escape(failed_reports_message(failed))}</p>")
+        if not analysed:
+            if not failed:
+                parts.append(f"<p>{html_escape(empty_section_message(data))}</p>")
+            return "\n".join(parts) + "\n"
+        parts.append("<table><tr><th>Titre du Rapport / Date de Publication</th><th>Synthèse de l'Analyse par l'IA</th></tr>")
+        for rapport in analysed:
+            parts.append(f"<tr><td><a href=\"{html_escape(rapport['url'])}\"><b>{html_escape(rapport['titre'])}</b></a>"
+                         f"<br><i>(Date extraite : {html_escape(rapport['date'])})</i></td>"
+                         f"<td class=\"analyse\">{html_escape(rapport.get('analyse_ia', 'Analyse non disponible.'))}</td></tr>")
+        parts.append("</table>")
+        return "\n".join(parts) + "\n"
+
+    def footer(self):
+        return "</body></html>\n"
+
+REPORT_STREAMS = {'docx': _WordStream, 'md': _MarkdownStream, 'html': _HtmlStream}
+
+class StreamingReport:
+    """Rapports (Word et, en option, Markdown/HTML) alimentés une société à la fois.
+
+    `outputs` associe chaque format ('docx', 'md', 'html') à son chemin ; `scope` est la phrase
+    de périmètre placée en tête (voir report_scope). Les sections sont
+    ajoutées dans l'ordre d'appel de add_section, dès qu'une société est terminée ; les
+    fichiers définitifs n'apparaissent qu'à close().
+    """
+
+    def __init__(self, outputs, scope=REPORT_SCOPE):
+        self.paths = list(outputs.values())
+        self._streams = [REPORT_STREAMS[fmt](path, scope) for fmt, path in outputs.items()]
+        self.finished = False
+        self.aborted = False
+
+    def add_section(self, symbol, data):
+        for stream in self._streams:
+            stream.add_section(symbol, data)
+
+    def close(self):
+        self.finished = True
+        for stream in self._streams:
+            stream.close()
+        return self.paths
+
+    def abort(self):
+        if self.finished:
+            return
+        self.finished = self.aborted = True
+        for stream in self._streams:
+            try:
+                stream.abort()
+            except OSError:
+                pass
+
+# ------------------------------------------------------------------------------
+# 16. CLASSIFICATION DES RAPPORTS (EXERCICE, PÉRIODE, TYPE) ET SÉLECTION
+# ------------------------------------------------------------------------------
+class ReportClassification(NamedTuple):
+    """Lecture d'un titre de rapport : exercice, période ('T1'..'T4', 'S1', 'S2', 'annuel',
+    ou 'trimestriel' si le trimestre n'est pas précisé), type et variante (consolidé, social,
+    général, spécial)."""
+    annee: Optional[int]
+    periode: Optional[str]
+    type: str
+    certifie: bool
+    date: Optional[datetime] # Fin de la période, ou None si elle n'est pas identifiée
+    variante: Optional[str] = None
+
+    def date_label(self):
+        if self.date:
+            return self.date.strftime('%Y-%m-%d')
+        return str(self.annee) if self.annee else 'n.d.'
+
+    def sort_key(self):
+        return (self.annee or 0, self.date or datetime.min)
+
+class ReportClassifier:
+    """Classe les titres de rapports avec des expressions compilées une seule fois.
+
+    Les titres sont normalisés (minuscules, sans accents ni ponctuation) avant lecture :
+    « 1er Trimestre » -> T1, « S2 » -> S2, « 31/12/2024 » ou « annuel » -> annuel, etc.
+    Priorité des périodes : trimestre ou semestre numéroté, date de clôture (lue comme fin
+    de trimestre dans un titre « trimestriel »), « semestriel » seul (S1, le second semestre
+    relevant des comptes annuels), « trimestriel » seul, puis exercice annuel.
+    """
+
+    _ORDINALS = {'premier': 1, 'deuxieme': 2, 'second': 2, 'troisieme': 3, 'quatrieme': 4}
+    _PERIOD_ENDS = {'T1': (3, 31), 'T2': (6, 30), 'T3': (9, 30), 'T4': (12, 31), 'S1': (6, 30), 'S2': (12, 31), 'annuel': (12, 31)}
+    _DATE_PERIODS = {'03': 'T1', 'mars': 'T1', '06': 'S1', 'juin': 'S1', '09': 'T3', 'sept': 'T3', 'septembre': 'T3',
+                     '12': 'annuel', 'dec': 'annuel', 'decembre': 'annuel'}
+    _QUARTER_DATE_PERIODS = {'03': 'T1', 'mars': 'T1', '06': 'T2', 'juin': 'T2', '09': 'T3', 'sept': 'T3', 'septembre': 'T3',
+                             '12': 'T4', 'dec': 'T4', 'decembre': 'T4'}
+
+    YEAR_RE = re.compile(r'\b(20\d{2})\b')
+    QUARTER_RE = re.compile(r'\bt([1-4])\b|\b([1-4])\s*(?:er|e|eme|ieme)?\s*trimestre\b'
+                            r'|\b(premier|deuxieme|second|troisieme|quatrieme)\s+trimestre\b')
+    SEMESTER_RE = re.compile(r'\bs([12])\b|\b([12])\s*(?:er|e|eme|ieme|nd)?\s*semestre\b'
+                             r'|\b(premier|deuxieme|second)\s+semestre\b')
+    # « 30/06/2025 » est normalisé en « 30 06 2025 », « 30.06.2025 » garde ses points.
+    PERIOD_END_RE = re.compile(r'\b(?:31[ .](03|mars|12|dec|decembre)|30[ .](06|juin|09|sept|septembre))\b')
+    QUARTERLY_RE = re.compile(r'\btrimestriel(?:le)?s?\b')
+    SEMIANNUAL_RE = re.compile(r'\bsemestriel(?:le)?s?\b')
+    ANNUAL_RE = re.compile(r'\bannuel(?:le)?s?\b|\bexercice\b')
+    CERTIFIED_RE = re.compile(r'\bcertifie(?:e|s|es)?\b')
+    # L'ordre compte : un titre prend le premier type reconnu.
+    TYPE_PATTERNS = [
+        ('rapport_commissaires', re.compile(r'\bcommissaires aux comptes\b')),
+        ('etats_financiers', re.compile(r'\betats financiers\b')),
+        ('rapport_annuel', re.compile(r'\brapport annuel\b')),
+        ('comptes', re.compile(r'\bcomptes (?:annuels|semestriels|consolides|sociaux)\b|\bbilan\b')),
+        ('rapport_activite', re.compile(r'\brapport (?:d )?activites?\b|\bindicateurs? d activite')),
+        ('assemblee_generale', re.compile(r'\bassemblee generale\b|\bag[eo]\b|\bconvocation\b')),
+        ('dividende', re.compile(r'\bdividendes?\b')),
+        ('communique', re.compile(r'\bcommuniques?\b')),
+    ]
+    # Publications distinctes d'une même période : comptes consolidés / sociaux, rapport général / spécial.
+    VARIANT_PATTERNS = [
+        ('consolide', re.compile(r'\bconsolide(?:e|s|es)?\b')),
+        ('social', re.compile(r'\bsociaux\b|\bindividuels?\b')),
+        ('general', re.compile(r'\bgeneral\b')),
+        ('special', re.compile(r'\bspecial\b')),
+    ]
+
+    @classmethod
+    def _period(cls, text):
+        match = cls.QUARTER_RE.search(text)
+        if match:
+            number = match.group(1) or match.group(2)
+            return f"T{number or cls._ORDINALS[match.group(3)]}"
+        match = cls.SEMESTER_RE.search(text)
+        if match:
+            number = match.group(1) or match.group(2)
+            return f"S{number or cls._ORDINALS[match.group(3)]}"
+        quarterly = cls.QUARTERLY_RE.search(text)
+        match = cls.PERIOD_END_RE.search(text)
+        if match:
+            periods = cls._QUARTER_DATE_PERIODS if quarterly else cls._DATE_PERIODS
+            return periods[match.group(1) or match.group(2)]
+        if cls.SEMIANNUAL_RE.search(text):
+            return 'S1'
+        if quarterly:
+            return 'trimestriel'
+        if cls.ANNUAL_RE.search(text):
+            return 'annuel'
+        return None
+
+    @staticmethod
+    def classify(title):
+        return _classify_report_title(title)
+
+    @classmethod
+    def _classify(cls, title):
+        text = normalize_text(title)
+        year_match = cls.YEAR_RE.search(text)
+        annee = int(year_match.group(1)) if year_match else None
+        periode = cls._period(text)
+        type_rapport = next((name for name, pattern in cls.TYPE_PATTERNS if pattern.search(text)), 'autre')
+        variante = next((name for name, pattern in cls.VARIANT_PATTERNS if pattern.search(text)), None)
+        date = None
+        if annee and periode in cls._PERIOD_ENDS:
+            month, day = cls._PERIOD_ENDS[periode]
+            date = datetime(annee, month, day)
+        return ReportClassification(annee, periode, type_rapport, bool(cls.CERTIFIED_RE.search(text)), date, variante)
+
+# Cache au niveau du module : les motifs sont des attributs de classe, aucune instance n'est retenue.
+@lru_cache(maxsize=8192)
+def _classify_report_title(title):
+    return ReportClassifier._classify(title)
+
+SELECTION_RULE_KEYS = {'annee_min', 'annee_max', 'periodes', 'types', 'certifie'}
+
+def validate_selection_rules(rules):
+    """Vérifie une liste de règles de sélection (voir REPORT_SELECTION_RULES) ; lève ValueError sinon."""
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("les règles de sélection doivent être une liste non vide")
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise ValueError(f"règle invalide : {rule!r}")
+        unknown = set(rule) - SELECTION_RULE_KEYS
+        if unknown:
+            raise ValueError(f"clé(s) de règle inconnue(s) : {', '.join(sorted(unknown))}")
+    return rules
+
+def describe_selection_rule(rule):
+    parts = []
+    annee_min, annee_max = rule.get('annee_min'), rule.get('annee_max')
+    if annee_min and annee_min == annee_max:
+        parts.append(f"exercice {annee_min}")
+    elif annee_min and annee_max:
+        parts.append(f"exercices {annee_min} à {annee_max}")
+    elif annee_min:
+        parts.append(f"exercices à partir de {annee_min}")
+    elif annee_max:
+        parts.append(f"exercices jusqu'à {annee_max}")
+    if 'periodes' in rule:
+        parts.append(f"périodes {', '.join(rule['periodes'])}")
+    if 'types' in rule:
+        parts.append(f"types {', '.join(rule['types'])}")
+    if 'certifie' in rule:
+        parts.append("rapports certifiés" if rule['certifie'] else "rapports non certifiés")
+    return ", ".join(parts) or "tous les rapports"
+
+def report_scope(rules):
+    """Phrase de périmètre du rapport : le texte d'origine pour les règles par défaut, sinon la liste des règles."""
+    if rules == REPORT_SELECTION_RULES:
+        return REPORT_SCOPE
+    return ("Ce rapport analyse les rapports retenus par les règles de sélection suivantes : "
+            + " ; ".join(describe_selection_rule(rule) for rule in rules) + ".")
+
+def load_selection_rules(path):
+    with open(path, encoding='utf-8') as f:
+        return validate_selection_rules(json.load(f))
+
+def rule_matches(rule, classement):
+    if classement.annee is None:
+        return False
+    if classement.annee < rule.get('annee_min', classement.annee) or classement.annee > rule.get('annee_max', classement.annee):
+        return False
+    if 'periodes' in rule and classement.periode not in rule['periodes']:
+        return False
+    if 'types' in rule and classement.type not in rule['types']:
+        return False
+    if 'certifie' in rule and classement.certifie != rule['certifie']:
+        return False
+    return True
+
+class ReportIndex:
+    """Rapports collectés, indexés par (symbole, exercice, période, type, variante).
+
+    La sélection lit les clés d'un symbole au lieu de re-parcourir les titres ; un rapport
+    périodique publié plusieurs fois sous la même clé (ex. version provisoire puis certifiée)
+    n'est retenu qu'une fois : la première version certifiée, sinon la première de la page
+    de la société. Un titre sans période précise (ou sans exercice) n'est jamais écarté.
+    """
+
+    def __init__(self):
+        self._reports = {}
+        self._keys_by_symbol = defaultdict(list)
+
+    def add(self, symbol, report):
+        classement = report['classement']
+        key = (symbol, classement.annee, classement.periode, classement.type, classement.variante)
+        if key not in self._reports:
+            self._reports[key] = []
+            self._keys_by_symbol[symbol].append(key)
+        self._reports[key].append(report)
+
+    def get(self, symbol, annee, periode, type_rapport, variante=None):
+        return list(self._reports.get((symbol, annee, periode, type_rapport, variante), []))
+
+    def select(self, symbol, rules):
+        selected = []
+        for key in self._keys_by_symbol.get(symbol, []):
+            reports = [r for r in self._reports[key] if any(rule_matches(rule, r['classement']) for rule in rules)]
+            _, annee, periode, type_rapport, _ = key
+            # Période précise uniquement : trois « rapports trimestriels » d'un exercice sont distincts.
+            if len(reports) > 1 and reports[0]['classement'].date and type_rapport in DEDUP_REPORT_TYPES:
+                kept = next((r for r in reports if r['classement'].certifie), reports[0])
+                for duplicate in reports:
+                    if duplicate is not kept:
+                        logger.warning(f"  -> [{symbol}] Doublon ignoré ({type_rapport} {periode} {annee}) : "
+                                       f"{duplicate['titre'][:60]}... (retenu : {kept['titre'][:60]})")
+                reports = [kept]
+            selected.extend(reports)
+        selected.sort(key=lambda r: r['classement'].sort_key(), reverse=True)
+        return selected
+
+# ------------------------------------------------------------------------------
+# 17. CLASSE PRINCIPALE DE L'ANALYSEUR
 # ------------------------------------------------------------------------------
 class BRVMAnalyzer:
-    def __init__(self, spreadsheet_id, api_key):
+    def __init__(self, spreadsheet_id, api_key, force_reanalysis=False, cache=None,
+                 max_workers=ANALYSIS_WORKERS, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+                 scraper_mode=SCRAPER_MODE, base_url=BRVM_BASE_URL, crawl_state=None, incremental=False,
+                 page_selection=PAGE_SELECTION_MODE, metrics_store=None, sync_sheet=False, journal=None,
+                 run_metrics=None, prometheus_path=None, max_attempts=MAX_ATTEMPTS, batch_size=1, shard=None,
+                 report_formats=REPORT_FORMATS, selenium_wire=SELENIUM_WIRE, selection_rules=None):
         self.spreadsheet_id = spreadsheet_id
         self.api_key = api_key
+        self.force_reanalysis = force_reanalysis
+        self.cache = cache
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.scraper_mode = scraper_mode
+        self.base_url = base_url.rstrip('/')
+        self.crawl_state = crawl_state
+        self.incremental = incremental
+        self.page_selection = page_selection
+        # Avec un MetricsStore, le modèle renvoie des métriques JSON au lieu d'une synthèse libre.
+        self.metrics_store = metrics_store
+        self.sync_sheet = sync_sheet
+        self.journal = journal
+        self.run_metrics = run_metrics or RunMetrics()
+        self.prometheus_path = prometheus_path
+        self.retry_policy = RetryPolicy(max_attempts=max_attempts)
+        # batch_size > 1 : les rapports d'une société sont analysés ensemble (voir _analyze_reports_batch).
+        self.batch_size = max(1, min(batch_size, BATCH_MAX_DOCUMENTS))
+        # shard = (i, N) : seules les sociétés de la partition i sont collectées et analysées.
+        self.shard = shard
+        self.report_formats = list(report_formats)
+        self.selenium_wire = selenium_wire
+        self.selection_rules = validate_selection_rules(selection_rules or REPORT_SELECTION_RULES)
+        self.report_classifier = ReportClassifier()
+        self.gemini_breaker = CircuitBreaker('Gemini')
+        self.download_breaker = CircuitBreaker('BRVM (PDF)')
+        if page_selection != 'off' and PdfReader is None:
+            logger.warning("⚠️ pypdf n'est pas installé : pré-sélection des pages désactivée, envoi des PDF complets.")
+            self.page_selection = 'off'
         
         # ======================================================================
         # LISTE FINALE DES 47 SOCIÉTÉS (INCLUANT STAC, CIEC, BICC)
@@ -108,10 +1701,17 @@ class BRVMAnalyzer:
         }
 
         self.gc = None
+        self.spreadsheet = None
+        self.worksheets = None
         self.driver = None
         self.gemini_model = None
         self.original_societes_mapping = self.societes_mapping.copy()
+        self.symbol_matcher = SymbolMatcher(self.original_societes_mapping)
         self.session = requests.Session()
+        pool_size = max(self.max_workers, CRAWL_WORKERS) * 2
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'})
         
     def setup_selenium(self):
@@ -120,20 +1720,39 @@ class BRVMAnalyzer:
         chrome_options.add_argument('--no-sandbox')
         chrome_options.add_argument('--disable-dev-shm-usage')
         chrome_options.add_argument("--window-size=1920,1080")
+        # Seul le DOM compte (table.views-table) : pas d'attente des sous-ressources, images désactivées.
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
-            logger.info("✅ Pilote Selenium (Chrome) démarré.")
+            if self.selenium_wire:
+                # selenium-wire fait passer et enregistre en mémoire chaque requête : réservé à l'interception.
+                from seleniumwire import webdriver as wire_webdriver
+                self.driver = wire_webdriver.Chrome(options=chrome_options)
+            else:
+                self.driver = webdriver.Chrome(options=chrome_options)
+            self._block_selenium_resources()
+            logger.info(f"✅ Pilote Selenium (Chrome{' + selenium-wire' if self.selenium_wire else ''}) démarré.")
         except Exception as e:
             logger.error(f"❌ Impossible de démarrer le pilote Selenium: {e}")
+            if self.driver:
+                self.driver.quit()
             self.driver = None
 
+    def _block_selenium_resources(self):
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': SELENIUM_BLOCKED_URLS})
+        except Exception as e:
+            logger.warning(f"⚠️ Blocage des CSS et polices indisponible ({e}). Seules les images sont désactivées.")
+
     def configure_gemini(self):
         if not self.api_key:
             logger.error("❌ Clé API Google (GOOGLE_API_KEY) non trouvée. L'analyse par IA est impossible.")
             return False
         try:
             genai.configure(api_key=self.api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
+            self.gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
             logger.info("✅ API Gemini configurée avec succès.")
             return True
         except Exception as e:
@@ -161,7 +1780,9 @@ class BRVMAnalyzer:
         try:
             logger.info(f"Vérification des feuilles dans G-Sheet...")
             sheet = self.gc.open_by_key(self.spreadsheet_id)
-            existing_sheets = [ws.title for ws in sheet.worksheets()]
+            self.spreadsheet = sheet
+            self.worksheets = {ws.title: ws for ws in sheet.worksheets()}
+            existing_sheets = list(self.worksheets)
             logger.info(f"Onglets trouvés : {existing_sheets}")
             symbols_to_keep = [s for s in self.original_societes_mapping if s in existing_sheets]
             self.societes_mapping = {k: v for k, v in self.original_societes_mapping.items() if k in symbols_to_keep}
@@ -174,296 +1795,925 @@ class BRVMAnalyzer:
             logger.error(f"❌ Erreur lors de la vérification du G-Sheet: {e}")
             return False
 
+    def apply_shard(self):
+        if not self.shard:
+            return
+        index, count = self.shard
+        # Répartition calculée sur la liste complète : identique sur tous les runners.
+        shards = assign_shards(self.original_societes_mapping, count)
+        self.societes_mapping = {
+            symbol: info for symbol, info in self.societes_mapping.items() if shards[symbol] == index
+        }
+        logger.info(f"🧩 Partition {index}/{count} : {len(self.societes_mapping)} société(s) "
+                    f"({', '.join(self.societes_mapping) or 'aucune'}).")
+
     def _normalize_text(self, text):
-        if not text: return ""
-        text = text.replace('-', ' ')
-        text = ''.join(c for c in unicodedata.normalize('NFD', str(text).lower()) if unicodedata.category(c) != 'Mn')
-        text = re.sub(r'[^a-z0-9\s\.]', ' ', text)
-        return re.sub(r'\s+', ' ', text).strip()
+        return normalize_text(text)
     
+    def _absolute_url(self, href):
+        return href if href.startswith('http') else f"{self.base_url}{href}"
+
+    def _extract_listing_rows(self, html):
+        """Retourne les lignes [texte du lien, href] d'une page de liste, ou None si la page n'a pas de tableau."""
+        soup = BeautifulSoup(html, 'html.parser')
+        table_rows = soup.select("table.views-table tbody tr")
+        if not table_rows:
+            return None
+        rows = []
+        for row in table_rows:
+            link_tag = row.find('a', href=True)
+            if link_tag:
+                rows.append([link_tag.text, link_tag['href']])
+        return rows
+
+    def _resolve_listing_rows(self, rows):
+        """Associe les lignes d'une page de liste aux symboles suivis (liens des sociétés, ou None)."""
+        if rows is None:
+            return None
+        company_links = []
+        for text, href in rows:
+            symbol = self._get_symbol_from_name(self._normalize_text(text))
+            if symbol:
+                company_links.append({'symbol': symbol, 'url': self._absolute_url(href)})
+        return company_links
+
+    def _parse_listing_page(self, html):
+        """Retourne les liens des sociétés suivies d'une page de liste, ou None si la page ne liste aucune société."""
+        return self._resolve_listing_rows(self._extract_listing_rows(html))
+
+    def _parse_company_page(self, html):
+        """Retourne les rapports PDF (titre, URL) listés sur la page d'une société."""
+        page_soup = BeautifulSoup(html, 'html.parser')
+        reports = []
+        for item in page_soup.select("table.views-table tbody tr"):
+            pdf_link_tag = item.find('a', href=lambda href: href and '.pdf' in href.lower())
+            if pdf_link_tag:
+                reports.append({
+                    'titre': " ".join(item.get_text().split()),
+                    'url': self._absolute_url(pdf_link_tag['href'])
+                })
+        return reports
+
+    def _merge_company_links(self, pages):
+        company_links = []
+        seen_urls = set()
+        for page_links in pages:
+            for link in page_links:
+                if link['symbol'] in self.societes_mapping and link['url'] not in seen_urls:
+                    seen_urls.add(link['url'])
+                    company_links.append(link)
+        return company_links
+
+    def _add_reports(self, all_reports, symbol, reports):
+        known_urls = {r['url'] for r in all_reports[symbol]}
+        for entry in reports:
+            if entry['url'] not in known_urls:
+                known_urls.add(entry['url'])
+                classement = self.report_classifier.classify(entry['titre'])
+                report_data = {
+                    'titre': entry['titre'],
+                    'url': entry['url'],
+                    'classement': classement,
+                    'date': classement.date,
+                    'nouveau': self.crawl_state.is_new_report(symbol, entry['url']) if self.crawl_state else True
+                }
+                all_reports[symbol].append(report_data)
+                logger.info(f"  -> [{symbol}] Trouvé{' (nouveau)' if report_data['nouveau'] else ''} : {report_data['titre'][:70]}...")
+
+    def _fetch_page(self, url, parse):
+        """Télécharge et analyse une page. Sur une réponse 304, réutilise le résultat du passage précédent."""
+        headers = self.crawl_state.conditional_headers(url) if self.crawl_state else {}
+        with self.run_metrics.stage('http_page'):
+            response = self.session.get(url, timeout=30, verify=False, headers=headers)
+        if response.status_code == 304:
+            self.run_metrics.incr('http_304')
+            payload = self.crawl_state.get_payload(url)
+            if payload is not None:
+                return payload
+            with self.run_metrics.stage('http_page'):
+                response = self.session.get(url, timeout=30, verify=False)
+        response.raise_for_status()
+        self.run_metrics.incr('http_page_bytes', len(response.content))
+        payload = parse(response.text)
+        if self.crawl_state:
+            self.crawl_state.store_page(url, response.headers, payload)
+        return payload
+
     def _find_all_reports(self):
-        if not self.driver: return {}
-        base_url = "https://www.brvm.org/fr/rapports-societes-cotees"
+        with self.run_metrics.stage('crawl'):
+            return self._crawl_reports()
+
+    def _crawl_reports(self):
+        """Rapports collectés par symbole ; None si la collecte a échoué.
+
+        Un dict vide signifie que la liste a bien été lue mais ne contient aucune société
+        suivie (ex. partition dont aucun émetteur n'est coté) : pas de bascule sur Selenium.
+        """
+        if self.scraper_mode in ('auto', 'http'):
+            all_reports = self._find_all_reports_http()
+            if all_reports is not None or self.scraper_mode == 'http':
+                return all_reports
+            logger.warning("⚠️ La collecte HTTP n'a rien donné. Bascule sur Selenium.")
+        if not self.driver:
+            with self.run_metrics.stage('selenium_startup'):
+                self.setup_selenium()
+        return self._find_all_reports_selenium()
+
+    def _find_all_reports_http(self):
+        listing_url = f"{self.base_url}/fr/rapports-societes-cotees"
         all_reports = defaultdict(list)
-        company_links = []
         try:
-            for page_num in range(5): 
-                page_url = f"{base_url}?page={page_num}"
-                logger.info(f"Navigation vers la page de liste : {page_url}")
-                self.driver.get(page_url)
+            # Les pages de liste sont récupérées en parallèle ; la pagination s'arrête
+            # à la première page sans tableau ou sans ligne, comme en mode Selenium.
+            page_urls = [f"{listing_url}?page={page_num}" for page_num in range(LISTING_MAX_PAGES)]
+            logger.info(f"Collecte HTTP de {len(page_urls)} pages de liste...")
+            def fetch_listing(page_url):
                 try:
-                    WebDriverWait(self.driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, "table.views-table")))
-                except TimeoutException:
-                    logger.info(f"La page {page_num} ne semble pas contenir de tableau. Fin de la pagination.")
+                    # Lignes brutes en cache : un émetteur ajouté au mapping est reconnu même sur un 304.
+                    return self._resolve_listing_rows(self._fetch_page(page_url, self._extract_listing_rows))
+                except Exception as e:
+                    logger.info(f"Page de liste inaccessible ({page_url}) : {e}")
+                    return None
+
+            with ThreadPoolExecutor(max_workers=CRAWL_WORKERS, thread_name_prefix='collecte') as executor:
+                listing_pages = list(executor.map(fetch_listing, page_urls))
+            pages = []
+            for page_num, page_links in enumerate(listing_pages):
+                if page_links is None:
+                    logger.info(f"Aucune société trouvée sur la page {page_num}. Fin de la pagination.")
                     break
-                soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-                table_rows = soup.select("table.views-table tbody tr")
-                if not table_rows:
+                pages.append(page_links)
+            if not pages:
+                return None
+            company_links = self._merge_company_links(pages)
+            logger.info(f"Collecte des liens terminée. {len(company_links)} pages de sociétés pertinentes à visiter.")
+            if not company_links:
+                logger.warning("⚠️ Aucune des sociétés suivies n'apparaît dans la liste des rapports.")
+                return {}
+
+            def fetch_company(company):
+                try:
+                    return self._fetch_page(company['url'], self._parse_company_page)
+                except Exception as e:
+                    logger.error(f"  -> Erreur sur la page de {company['symbol']}: {e}. Passage au suivant.")
+                    return []
+
+            with ThreadPoolExecutor(max_workers=CRAWL_WORKERS, thread_name_prefix='collecte') as executor:
+                company_pages = list(executor.map(fetch_company, company_links))
+            for company, reports in zip(company_links, company_pages):
+                if not reports:
+                    logger.warning(f"  -> Aucun rapport listé sur la page de {company['symbol']}.")
+                self._add_reports(all_reports, company['symbol'], reports)
+            if self.crawl_state and self.crawl_state.not_modified_count:
+                logger.info(f"♻️  {self.crawl_state.not_modified_count} page(s) inchangée(s) depuis le dernier passage (HTTP 304).")
+        except Exception as e:
+            logger.error(f"Erreur lors de la collecte HTTP : {e}", exc_info=True)
+            return None
+        # Pages de sociétés toutes vides : collecte considérée en échec (bascule possible sur Selenium).
+        return all_reports or None
+
+    def _selenium_fetch_page(self, url, parse):
+        """Charge une page et retourne parse(page_source), ou None si le tableau n'apparaît pas à temps."""
+        with self.run_metrics.stage('selenium_page_load'):
+            self.driver.get(url) # Chargement 'eager' : rend la main dès le DOM prêt
+        try:
+            with self.run_metrics.stage('selenium_wait'):
+                WebDriverWait(self.driver, SELENIUM_WAIT_SECONDS).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "table.views-table")))
+        except TimeoutException:
+            return None
+        return parse(self.driver.page_source)
+
+    def _find_all_reports_selenium(self):
+        if not self.driver: return None
+        base_url = f"{self.base_url}/fr/rapports-societes-cotees"
+        all_reports = defaultdict(list)
+        pages = []
+        try:
+            for page_num in range(LISTING_MAX_PAGES):
+                page_url = f"{base_url}?page={page_num}"
+                logger.info(f"Navigation vers la page de liste : {page_url}")
+                page_links = self._selenium_fetch_page(page_url, self._parse_listing_page)
+                if page_links is None:
                     logger.info(f"Aucune société trouvée sur la page {page_num}. Fin de la pagination.")
                     break
-                for row in table_rows:
-                    link_tag = row.find('a', href=True)
-                    if link_tag:
-                        company_name_normalized = self._normalize_text(link_tag.text)
-                        company_url = f"https://www.brvm.org{link_tag['href']}"
-                        symbol = self._get_symbol_from_name(company_name_normalized)
-                        if symbol and symbol in self.societes_mapping:
-                            if not any(c['url'] == company_url for c in company_links):
-                                company_links.append({'symbol': symbol, 'url': company_url})
-                time.sleep(1)
+                pages.append(page_links)
+            if not pages:
+                return None
+            company_links = self._merge_company_links(pages)
             logger.info(f"Collecte des liens terminée. {len(company_links)} pages de sociétés pertinentes à visiter.")
             for company in company_links:
                 symbol = company['symbol']
                 logger.info(f"--- Collecte des rapports pour {symbol} ---")
                 try:
-                    self.driver.get(company['url'])
-                    WebDriverWait(self.driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, "table.views-table")))
-                    page_soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-                    report_items = page_soup.select("table.views-table tbody tr")
-                    if not report_items:
-                        logger.warning(f"  -> Aucun rapport listé sur la page de {symbol}.")
-                        continue
-                    for item in report_items:
-                        pdf_link_tag = item.find('a', href=lambda href: href and '.pdf' in href.lower())
-                        if pdf_link_tag:
-                            full_url = pdf_link_tag['href'] if pdf_link_tag['href'].startswith('http') else f"https://www.brvm.org{pdf_link_tag['href']}"
-                            if not any(r['url'] == full_url for r in all_reports[symbol]):
-                                report_data = {
-                                    'titre': " ".join(item.get_text().split()),
-                                    'url': full_url,
-                                    'date': self._extract_date_from_text(item.get_text())
-                                }
-                                all_reports[symbol].append(report_data)
-                                logger.info(f"  -> Trouvé : {report_data['titre'][:70]}...")
-                    time.sleep(1)
-                except TimeoutException:
-                    logger.error(f"  -> Timeout sur la page de {symbol}. Passage au suivant.")
+                    reports = self._selenium_fetch_page(company['url'], self._parse_company_page)
                 except Exception as e:
                     logger.error(f"  -> Erreur sur la page de {symbol}: {e}. Passage au suivant.")
+                    continue
+                if reports is None:
+                    logger.error(f"  -> Timeout sur la page de {symbol}. Passage au suivant.")
+                elif not reports:
+                    logger.warning(f"  -> Aucun rapport listé sur la page de {symbol}.")
+                else:
+                    self._add_reports(all_reports, symbol, reports)
         except Exception as e:
             logger.error(f"Erreur critique lors du scraping : {e}", exc_info=True)
-            return {}
+            return None
         return all_reports
 
     def _get_symbol_from_name(self, company_name_normalized):
-        for symbol, info in self.original_societes_mapping.items():
-            for alt in info['alternatives']:
-                if alt in company_name_normalized:
-                    return symbol
-        return None
+        return self.symbol_matcher.match(company_name_normalized)
+
+    def _download_pdf(self, pdf_url):
+        """Télécharge un PDF par blocs dans un fichier temporaire et calcule son SHA-256 au fil de l'eau.
+
+        Retourne (chemin, sha256, taille). Le fichier appartient à l'appelant, qui doit le supprimer.
+        """
+        with self.session.get(pdf_url, timeout=45, verify=False, stream=True) as response:
+            if response.status_code in MISSING_HTTP_STATUSES:
+                raise PDFRejectedError(f"PDF introuvable sur le site de la BRVM (HTTP {response.status_code}).")
+            response.raise_for_status()
+            content_length = response.headers.get('Content-Length')
+            if content_length and content_length.isdigit():
+                if int(content_length) < PDF_MIN_BYTES:
+                    raise PDFRejectedError("Fichier PDF invalide ou vide.")
+                if int(content_length) > PDF_MAX_BYTES:
+                    raise PDFRejectedError(f"Fichier PDF trop volumineux ({int(content_length)} octets, plafond {PDF_MAX_BYTES}).")
+
+            sha256 = hashlib.sha256()
+            size = 0
+            # Un fichier temporaire par rapport : les workers ne se marchent pas dessus.
+            with tempfile.NamedTemporaryFile(prefix='brvm_', suffix='.pdf', delete=False) as f:
+                temp_pdf_path = f.name
+                try:
+                    for chunk in response.iter_content(chunk_size=PDF_CHUNK_BYTES):
+                        size += len(chunk)
+                        if size > PDF_MAX_BYTES:
+                            raise PDFRejectedError(f"Fichier PDF trop volumineux (plus de {PDF_MAX_BYTES} octets).")
+                        sha256.update(chunk)
+                        f.write(chunk)
+                    if size < PDF_MIN_BYTES:
+                        raise PDFRejectedError("Fichier PDF invalide ou vide.")
+                    self.run_metrics.incr('pdf_bytes', size)
+                except BaseException:
+                    f.close()
+                    os.remove(temp_pdf_path)
+                    raise
+        return temp_pdf_path, sha256.hexdigest(), size
+
+    def _analysis_prompt(self):
+        return PROMPT_EXTRACTION_JSON if self.metrics_store else PROMPT_ANALYSE
+
+    def _build_gemini_request(self, pdf_path, pdf_size):
+        """Prépare le document envoyé à Gemini selon le mode de pré-sélection.
+
+        Retourne (parties du document, sans le prompt ; chemin d'un PDF réduit à supprimer ou None ; fichier envoyé ou None).
+        """
+        selected_pages = None
+        if self.page_selection != 'off':
+            try:
+                with self.run_metrics.stage('page_selection'):
+                    selected_pages = select_financial_pages(pdf_path)
+            except Exception as e:
+                logger.warning(f"    -> Extraction locale du texte impossible ({e}). Envoi du PDF complet.")
+            if selected_pages is None:
+                logger.info("    -> Aucune page financière identifiée localement. Envoi du PDF complet.")
+
+        if selected_pages and self.page_selection == 'text':
+            extracted_text = "\n\n".join(f"--- Page {page_num + 1} ---\n{text}" for page_num, text in selected_pages)
+            logger.info(f"    -> Envoi du texte de {len(selected_pages)} page(s) ({len(extracted_text)} caractères) à l'API Gemini...")
+            return [PROMPT_EXTRAIT_TEXTE, extracted_text], None, None
+
+        reduced_pdf_path = None
+        if selected_pages:
+            reduced_pdf_path = write_pdf_pages(pdf_path, [page_num for page_num, _ in selected_pages])
+            upload_path = reduced_pdf_path
+            logger.info(f"    -> Envoi de {len(selected_pages)} page(s) sélectionnée(s) ({os.path.getsize(upload_path)} octets sur {pdf_size}) à l'API Gemini...")
+        else:
+            upload_path = pdf_path
+            logger.info(f"    -> Envoi du fichier PDF ({pdf_size} octets) à l'API Gemini...")
+        try:
+            with self.run_metrics.stage('gemini_upload'):
+                uploaded_file = self.retry_policy.call(
+                    lambda: genai.upload_file(path=upload_path, display_name="Rapport Financier BRVM"),
+                    "Envoi du fichier à Gemini", breaker=self.gemini_breaker
+                )
+            self.run_metrics.incr('uploaded_bytes', os.path.getsize(upload_path))
+        except Exception:
+            if reduced_pdf_path:
+                os.remove(reduced_pdf_path)
+            raise
+        return [uploaded_file], reduced_pdf_path, uploaded_file
+
+    def _release_upload(self, reduced_pdf_path, uploaded_file):
+        if uploaded_file:
+            try:
+                logger.info(f"    -> Suppression du fichier temporaire de l'API Gemini.")
+                genai.delete_file(uploaded_file.name)
+            except Exception as e:
+                logger.warning(f"    -> N'a pas pu supprimer le fichier temporaire de l'API : {e}")
+        if reduced_pdf_path and os.path.exists(reduced_pdf_path):
+            os.remove(reduced_pdf_path)
+
+    def _count_tokens(self, response):
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            self.run_metrics.incr('gemini_calls')
+            self.run_metrics.incr('prompt_tokens', getattr(usage, 'prompt_token_count', 0) or 0)
+            self.run_metrics.incr('output_tokens', getattr(usage, 'candidates_token_count', 0) or 0)
+
+    def _cache_version(self, batched=False):
+        cache_version = f"{GEMINI_MODEL_NAME}/{PROMPT_VERSION}"
+        if self.page_selection != 'off':
+            cache_version += f"/pages-{self.page_selection}"
+        if self.metrics_store:
+            cache_version += "/json"
+        if batched:
+            cache_version += "/lot"
+        return cache_version
 
-    def _extract_date_from_text(self, text):
-        if not text: return datetime(1900, 1, 1)
-        year_match = re.search(r'\b(20\d{2})\b', text)
-        if not year_match: return datetime(1900, 1, 1)
-        year = int(year_match.group(1))
-        text_lower = text.lower()
-        trim_match = re.search(r't(\d)|(\d)\s*er\s*trimestre', text_lower)
-        if trim_match:
-            trimester = int(trim_match.group(1) or trim_match.group(2))
-            return datetime(year, trimester * 3, 1)
-        sem_match = re.search(r's(\d)|(\d)\s*er\s*semestre', text_lower)
-        if sem_match:
-            semester = int(sem_match.group(1) or sem_match.group(2))
-            return datetime(year, 6 if semester == 1 else 12, 1)
-        if 'annuel' in text_lower or '31/12' in text or '31 dec' in text_lower: return datetime(year, 12, 31)
-        return datetime(year, 6, 15)
+    def _fetch_document(self, pdf_url, cache_version):
+        """Télécharge le PDF et cherche son analyse en cache.
+
+        Retourne un dict (path, sha256, size, cache_key, cached) ; le fichier `path` appartient à l'appelant.
+        """
+        with self.run_metrics.stage('pdf_download'):
+            temp_pdf_path, pdf_sha256, pdf_size = self.retry_policy.call(
+                lambda: self._download_pdf(pdf_url), "Téléchargement du PDF", breaker=self.download_breaker
+            )
+        document = {'path': temp_pdf_path, 'sha256': pdf_sha256, 'size': pdf_size, 'cached': None,
+                    'cache_key': AnalysisCache.make_key(pdf_url, pdf_sha256, cache_version)}
+        if self.cache and not self.force_reanalysis:
+            document['cached'] = self.cache.get(document['cache_key'])
+            if document['cached'] is not None:
+                self.run_metrics.incr('cache_hits')
+                logger.info(f"    -> ♻️  Analyse trouvée en cache (PDF inchangé, sha256 {pdf_sha256[:12]}…).")
+            else:
+                self.run_metrics.incr('cache_misses')
+        return document
+
+    def _remove_document(self, document):
+        if document and os.path.exists(document['path']):
+            os.remove(document['path'])
+            logger.info(f"    -> Suppression du fichier PDF local ({document['path']}).")
+
+    def _generate(self, request_content, description, json_output):
+        generation_config = {'response_mime_type': 'application/json'} if json_output else None
+
+        def generate():
+            # Chaque tentative consomme un jeton : les reprises respectent aussi le quota.
+            with self.run_metrics.stage('rate_limiter_wait'):
+                self.rate_limiter.acquire() # Respect du quota de l'API (inutile quand l'analyse vient du cache)
+            with self.run_metrics.stage('gemini_generate'):
+                if generation_config:
+                    return self.gemini_model.generate_content(request_content, generation_config=generation_config)
+                return self.gemini_model.generate_content(request_content)
+
+        response = self.retry_policy.call(generate, description, breaker=self.gemini_breaker)
+        self._count_tokens(response)
+        return response
+
+    @staticmethod
+    def _empty_response_message(response):
+        if response.prompt_feedback:
+            return f"Analyse bloquée par l'IA. Raison : {response.prompt_feedback.block_reason.name}."
+        return "Erreur inconnue : L'API Gemini n'a retourné ni contenu ni feedback."
 
     def _analyze_pdf_with_gemini(self, pdf_url):
         if not self.gemini_model:
             return "Analyse IA non disponible (API non configurée)."
         
         logger.info(f"    -> Téléchargement du PDF pour l'envoyer à Gemini...")
+        document = None
         uploaded_file = None
-        temp_pdf_path = "temp_report.pdf"
+        reduced_pdf_path = None
         try:
-            response = self.session.get(pdf_url, timeout=45, verify=False)
-            response.raise_for_status()
-            pdf_content = response.content
-            if len(pdf_content) < 1024:
-                return "Fichier PDF invalide ou vide."
-            with open(temp_pdf_path, 'wb') as f:
-                f.write(pdf_content)
-            logger.info(f"    -> Envoi du fichier PDF ({os.path.getsize(temp_pdf_path)} octets) à l'API Gemini...")
-            uploaded_file = genai.upload_file(
-                path=temp_pdf_path,
-                display_name="Rapport Financier BRVM"
-            )
-            prompt = """
-            Tu es un analyste financier expert spécialisé dans les entreprises de la zone UEMOA cotées à la BRVM.
-            Analyse le document PDF ci-joint, qui est un rapport financier, et fournis une synthèse concise en français, structurée en points clés.
+            cache_version = self._cache_version()
+            document = self._fetch_document(pdf_url, cache_version)
+            if document['cached'] is not None:
+                return document['cached']
 
-            Concentre-toi impérativement sur les aspects suivants :
-            - **Évolution du Chiffre d'Affaires (CA)** : Indique la variation en pourcentage et en valeur si possible. Mentionne les raisons de cette évolution.
-            - **Évolution du Résultat Net (RN)** : Indique la variation et les facteurs qui l'ont influencée.
-            - **Politique de Dividende** : Cherche toute mention de dividende proposé, payé ou des perspectives de distribution.
-            - **Performance des Activités Ordinaires/d'Exploitation** : Commente l'évolution de la rentabilité opérationnelle.
-            - **Perspectives et Points de Vigilance** : Relève tout point crucial pour un investisseur (endettement, investissements majeurs, perspectives, etc.).
-
-            Si une information n'est pas trouvée, mentionne-le clairement (ex: "Politique de dividende non mentionnée"). Sois factuel et base tes conclusions uniquement sur le document.
-            """
+            document_parts, reduced_pdf_path, uploaded_file = self._build_gemini_request(document['path'], document['size'])
             
-            logger.info("    -> Fichier envoyé. Génération de l'analyse...")
-            response = self.gemini_model.generate_content([prompt, uploaded_file])
+            logger.info("    -> Contenu envoyé. Génération de l'analyse...")
+            response = self._generate([self._analysis_prompt()] + document_parts, "Génération de l'analyse",
+                                      json_output=bool(self.metrics_store))
             
             if response.parts:
+                if self.metrics_store:
+                    # Une réponse hors schéma n'est pas mise en cache (ValueError -> erreur technique).
+                    validate_metrics(json.loads(response.text))
+                if self.cache:
+                    self.cache.set(document['cache_key'], pdf_url, document['sha256'], cache_version, response.text)
                 return response.text
-            elif response.prompt_feedback:
-                block_reason = response.prompt_feedback.block_reason.name
-                error_message = f"Analyse bloquée par l'IA. Raison : {block_reason}."
-                return error_message
-            else:
-                 return "Erreur inconnue : L'API Gemini n'a retourné ni contenu ni feedback."
+            return self._empty_response_message(response)
 
+        except PDFRejectedError as e:
+            return str(e)
+        except AnalysisFailedError:
+            raise
         except Exception as e:
-            error_details = f"Erreur technique lors de l'analyse par l'IA : {str(e)}"
-            return error_details
+            raise AnalysisFailedError(f"Erreur technique lors de l'analyse par l'IA : {str(e)}") from e
         finally:
-            if uploaded_file:
+            self._release_upload(reduced_pdf_path, uploaded_file)
+            self._remove_document(document)
+
+    def _split_batches(self, documents):
+        """Découpe les documents d'une société en lots bornés en nombre et en taille."""
+        batches, current, current_bytes = [], [], 0
+        for document in documents:
+            if current and (len(current) >= self.batch_size or current_bytes + document['size'] > BATCH_MAX_BYTES):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(document)
+            current_bytes += document['size']
+        if current:
+            batches.append(current)
+        return batches
+
+    def _parse_batch_response(self, text, count):
+        """Extrait l'analyse de chaque document d'une réponse en lot ; lève ValueError si elle est inexploitable."""
+        items = json.loads(text)
+        if isinstance(items, dict):
+            items = items.get('documents')
+        if not isinstance(items, list) or len(items) != count or not all(isinstance(item, dict) for item in items):
+            raise ValueError(f"{count} analyse(s) attendue(s) dans un tableau JSON")
+        numbers = [item.get('document') for item in items]
+        if sorted(str(n) for n in numbers) == sorted(str(n) for n in range(1, count + 1)):
+            items = sorted(items, key=lambda item: int(item['document']))
+        analyses = []
+        for item in items:
+            item = {key: value for key, value in item.items() if key != 'document'}
+            if self.metrics_store:
+                validate_metrics(item)
+                analyses.append(json.dumps(item, ensure_ascii=False))
+            elif isinstance(item.get('analyse'), str) and item['analyse'].strip():
+                analyses.append(item['analyse'].strip())
+            else:
+                raise ValueError("clé 'analyse' absente ou vide")
+        return analyses
+
+    def _analyze_batch(self, symbol, batch, cache_version):
+        """Analyse un lot de documents en un seul appel ; un lot refusé ou trop long est scindé en deux.
+
+        Les fichiers envoyés à Gemini sont conservés sur le document et réutilisés par les sous-lots.
+        """
+        split_reason = None
+        try:
+            request_content = [self._analysis_prompt(), PROMPT_LOT.format(
+                count=len(batch), reponse=PROMPT_LOT_REPONSE_JSON if self.metrics_store else PROMPT_LOT_REPONSE_TEXTE)]
+            for number, document in enumerate(batch, 1):
+                if 'parts' not in document:
+                    document['parts'], document['reduced_pdf_path'], document['uploaded_file'] = \
+                        self._build_gemini_request(document['path'], document['size'])
+                request_content.append(f"--- Document {number} : {document['report']['titre']} ---")
+                request_content.extend(document['parts'])
+
+            logger.info(f"  -> [{symbol}] Génération de l'analyse de {len(batch)} rapport(s) en une requête...")
+            response = self._generate(request_content, f"Analyse en lot de {len(batch)} rapport(s)", json_output=True)
+            if response.parts:
+                for document, analyse_ia in zip(batch, self._parse_batch_response(response.text, len(batch))):
+                    document['analysis']['analyse_ia'] = analyse_ia
+                    if self.cache:
+                        self.cache.set(document['cache_key'], document['report']['url'], document['sha256'],
+                                       cache_version, analyse_ia)
+                self.run_metrics.incr('batch_requests')
+            elif len(batch) == 1:
+                batch[0]['analysis']['analyse_ia'] = self._empty_response_message(response)
+            else:
+                split_reason = self._empty_response_message(response)
+        except Exception as e:
+            if len(batch) > 1 and (isinstance(e, ValueError) or is_context_limit_error(e)):
+                split_reason = str(e)
+            else:
+                for document in batch:
+                    self._mark_failed(symbol, document['analysis'], f"Erreur technique lors de l'analyse par l'IA : {str(e)}")
+
+        if split_reason:
+            self.run_metrics.incr('batch_splits')
+            logger.warning(f"  -> [{symbol}] Lot de {len(batch)} rapports scindé en deux ({split_reason}).")
+            half = len(batch) // 2
+            self._analyze_batch(symbol, batch[:half], cache_version)
+            self._analyze_batch(symbol, batch[half:], cache_version)
+
+    def _analyze_reports_batch(self, symbol, reports):
+        """Analyse tous les rapports retenus d'une société avec le moins d'appels Gemini possible.
+
+        Les rapports déjà journalisés ou en cache sont repris tels quels ; les autres sont envoyés
+        ensemble, en lots d'au plus `batch_size` documents et BATCH_MAX_BYTES octets.
+        """
+        analyses = {}
+        journaled_urls = set()
+        documents = []
+        cache_version = self._cache_version(batched=True)
+        try:
+            for report in reports:
+                journaled = self.journal.get(symbol, report['url']) if self.journal else None
+                if journaled is not None:
+                    logger.info(f"  -> [{symbol}] Déjà analysé (journal) : {report['titre'][:60]}...")
+                    analyses[report['url']] = journaled
+                    journaled_urls.add(report['url'])
+                    continue
+                self.run_metrics.incr('reports_analyzed')
+                logger.info(f"  -> [{symbol}] Analyse IA (lot) : {report['titre'][:60]}...")
+                analysis = analyses[report['url']] = self._new_analysis(report)
+                if not self.gemini_model:
+                    analysis['analyse_ia'] = "Analyse IA non disponible (API non configurée)."
+                    continue
                 try:
-                    logger.info(f"    -> Suppression du fichier temporaire de l'API Gemini.")
-                    genai.delete_file(uploaded_file.name)
+                    document = self._fetch_document(report['url'], cache_version)
+                except PDFRejectedError as e:
+                    analysis['analyse_ia'] = str(e)
+                    continue
                 except Exception as e:
-                    logger.warning(f"    -> N'a pas pu supprimer le fichier temporaire de l'API : {e}")
+                    self._mark_failed(symbol, analysis, f"Erreur technique lors de l'analyse par l'IA : {str(e)}")
+                    continue
+                if document['cached'] is not None:
+                    analysis['analyse_ia'] = document['cached']
+                    self._remove_document(document)
+                    continue
+                document.update(report=report, analysis=analysis)
+                documents.append(document)
+
+            for batch in self._split_batches(documents):
+                self._analyze_batch(symbol, batch, cache_version)
+        finally:
+            for document in documents:
+                self._release_upload(document.get('reduced_pdf_path'), document.get('uploaded_file'))
+                self._remove_document(document)
+
+        results = []
+        for report in reports:
+            analysis = analyses[report['url']]
+            if report['url'] not in journaled_urls:
+                analysis = self._finalize_analysis(symbol, report, analysis)
+                if self.journal:
+                    self.journal.record_report(symbol, self.societes_mapping[symbol]['nom_rapport'], analysis)
+            results.append(analysis)
+        return results
+
+    def _analyze_report(self, symbol, report):
+        if self.journal:
+            journaled = self.journal.get(symbol, report['url'])
+            if journaled is not None:
+                logger.info(f"  -> [{symbol}] Déjà analysé (journal) : {report['titre'][:60]}...")
+                return journaled
+        analysis = self._run_report_analysis(symbol, report)
+        if self.journal:
+            self.journal.record_report(symbol, self.societes_mapping[symbol]['nom_rapport'], analysis)
+        return analysis
+
+    @staticmethod
+    def _new_analysis(report):
+        return {
+            'titre': report['titre'],
+            'url': report['url'],
+            'date': report['classement'].date_label(),
+        }
+
+    def _mark_failed(self, symbol, analysis, message):
+        # Pas d'analyse à publier : le rapport sera repris au prochain run (--resume, --incremental).
+        self.run_metrics.incr('reports_failed')
+        logger.error(f"  -> [{symbol}] ❌ Analyse en échec, à réessayer : {message}")
+        analysis['a_reessayer'] = True
+        analysis['erreur'] = message
+
+    def _run_report_analysis(self, symbol, report):
+        self.run_metrics.incr('reports_analyzed')
+        logger.info(f"  -> [{symbol}] Analyse IA : {report['titre'][:60]}...")
+        analysis = self._new_analysis(report)
+        try:
+            analysis['analyse_ia'] = self._analyze_pdf_with_gemini(report['url'])
+        except AnalysisFailedError as e:
+            self._mark_failed(symbol, analysis, str(e))
+        return self._finalize_analysis(symbol, report, analysis)
 
-            if os.path.exists(temp_pdf_path):
-                os.remove(temp_pdf_path)
-                logger.info(f"    -> Suppression du fichier PDF local ({temp_pdf_path}).")
+    def _finalize_analysis(self, symbol, report, analysis):
+        if self.metrics_store and not analysis.get('a_reessayer'):
+            try:
+                metrics = validate_metrics(json.loads(analysis['analyse_ia']))
+            except ValueError:
+                # PDF refusé ou analyse bloquée : message conservé tel quel dans le rapport.
+                return analysis
+            self.metrics_store.upsert(symbol, analysis['date'], report['url'], report['titre'], metrics)
+            analysis['metriques'] = metrics
+            analysis['analyse_ia'] = format_metrics(metrics)
+        return analysis
 
-    def process_all_companies(self):
+    def process_all_companies(self, report=None):
         all_reports = self._find_all_reports()
         results = {}
-        if not all_reports:
+        if all_reports is None:
             logger.error("❌ ÉCHEC FINAL : Aucun rapport n'a pu être collecté sur le site de la BRVM.")
             return {}
         logger.info(f"\n✅ COLLECTE TERMINÉE : {sum(len(r) for r in all_reports.values())} rapports trouvés au total.")
-        
-        # --- DÉFINITION DES CRITÈRES DE FILTRAGE ---
-        date_2024_start = datetime(2024, 1, 1)
-        date_2025_start = datetime(2025, 1, 1)
-        keywords_financiers = ['états financiers', 'etats financiers', 'certifié', 'commissaires aux comptes', 'rapport annuel']
 
+        # --- SÉLECTION DES RAPPORTS PAR SOCIÉTÉ (index par exercice, période et type) ---
+        report_index = ReportIndex()
+        for symbol, reports in all_reports.items():
+            for entry in reports:
+                report_index.add(symbol, entry)
+        reports_by_symbol = {}
         for symbol, info in self.societes_mapping.items():
             logger.info(f"\n📊 Traitement des données pour {symbol} - {info['nom_rapport']}")
-            
-            company_reports = all_reports.get(symbol, [])
-            analysis_data = {'nom': info['nom_rapport'], 'rapports_analyses': []}
-
-            # --- BLOC DE FILTRAGE AVANCÉ ---
-            reports_to_analyze = []
-            for report in company_reports:
-                report_date = report['date']
-                title_lower = report['titre'].lower()
-
-                # Règle 1 : Rapports de 2024 (entre 01/01/2024 et 31/12/2024)
-                if date_2024_start <= report_date < date_2025_start:
-                    if any(keyword in title_lower for keyword in keywords_financiers):
-                        reports_to_analyze.append(report)
-                
-                # Règle 2 : Rapports à partir de 2025
-                elif report_date >= date_2025_start:
-                    reports_to_analyze.append(report)
-            
-            reports_to_analyze.sort(key=lambda x: x['date'], reverse=True)
-            
-            if not reports_to_analyze:
-                analysis_data['statut'] = 'Aucun rapport pertinent trouvé selon les critères de filtrage (date/titre).'
+            reports_to_analyze = report_index.select(symbol, self.selection_rules)
+            if self.incremental:
+                reports_to_analyze = [r for r in reports_to_analyze if r['nouveau']]
+            if reports_to_analyze:
+                logger.info(f"  -> {len(reports_to_analyze)} rapport(s) pertinent(s) trouvé(s) après filtrage.")
+            reports_by_symbol[symbol] = reports_to_analyze
+
+        # --- ANALYSE EN PARALLÈLE (téléchargement, envoi et génération se chevauchent) ---
+        # Le débit vers Gemini est borné par self.rate_limiter ; les résultats sont
+        # ensuite réassemblés dans l'ordre de sélection, donc identiques d'un run à l'autre.
+        total_jobs = sum(len(r) for r in reports_by_symbol.values())
+        logger.info(f"\n🚀 Analyse de {total_jobs} rapport(s) avec {self.max_workers} worker(s)...")
+        # En mode lot, une seule tâche par société, qui renvoie la liste de ses analyses.
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analyse') as executor:
+            futures_by_symbol = {}
+            for symbol, reports in reports_by_symbol.items():
+                # Chaque tâche garde la liste de ses rapports, pour les marquer en échec si elle lève.
+                if self.batch_size > 1 and len(reports) > 1:
+                    futures_by_symbol[symbol] = [(executor.submit(self._analyze_reports_batch, symbol, reports), reports)]
+                else:
+                    futures_by_symbol[symbol] = [(executor.submit(lambda s=symbol, r=entry: [self._analyze_report(s, r)]), [entry])
+                                                 for entry in reports]
+
+            for symbol, info in self.societes_mapping.items():
+                analysis_data = {'nom': info['nom_rapport'], 'rapports_analyses': []}
+                if not futures_by_symbol[symbol]:
+                    if self.incremental:
+                        analysis_data['statut'] = 'Aucun nouveau rapport pertinent depuis le dernier passage.'
+                    else:
+                        analysis_data['statut'] = 'Aucun rapport pertinent trouvé selon les critères de filtrage (date/titre).'
+                    if self.journal:
+                        self.journal.record_status(symbol, info['nom_rapport'], analysis_data['statut'])
+                for future, future_reports in futures_by_symbol[symbol]:
+                    try:
+                        analysis_data['rapports_analyses'].extend(future.result())
+                    except Exception as e:
+                        # Erreur hors analyse (base des métriques, journal...) : le run continue,
+                        # seuls les rapports de cette tâche sont à reprendre.
+                        for entry in future_reports:
+                            analysis = self._new_analysis(entry)
+                            self._mark_failed(symbol, analysis, f"Erreur inattendue : {e}")
+                            analysis_data['rapports_analyses'].append(analysis)
                 results[symbol] = analysis_data
-                continue
-            
-            logger.info(f"  -> {len(reports_to_analyze)} rapport(s) pertinent(s) trouvé(s) après filtrage.")
-
-            # --- BOUCLE D'ANALYSE SANS LIMITATION ---
-            for i, report in enumerate(reports_to_analyze):
-                logger.info(f"  -> Analyse IA {i+1}/{len(reports_to_analyze)}: {report['titre'][:60]}...")
-                
-                gemini_analysis = self._analyze_pdf_with_gemini(report['url'])
-                
-                analysis_data['rapports_analyses'].append({
-                    'titre': report['titre'], 
-                    'url': report['url'], 
-                    'date': report['date'].strftime('%Y-%m-%d'),
-                    'analyse_ia': gemini_analysis
-                })
-                
-                time.sleep(3) # Pause pour ne pas surcharger l'API
-            
-            results[symbol] = analysis_data
+                # Section du rapport écrite dès que la société est terminée (dans l'ordre du mapping).
+                if report and not report.finished:
+                    try:
+                        with self.run_metrics.stage('report_section'):
+                            report.add_section(symbol, analysis_data)
+                    except Exception as e:
+                        logger.error(f"❌ Écriture du rapport au fil de l'eau interrompue ({e}) : il sera généré en fin de run.")
+                        report.abort()
+                # Les rapports de la société ne sont considérés comme vus qu'une fois analysés ;
+                # ceux en échec restent « nouveaux » pour être repris au prochain run.
+                if self.crawl_state:
+                    failed_urls = {r['url'] for r in analysis_data['rapports_analyses'] if r.get('a_reessayer')}
+                    self.crawl_state.mark_seen(symbol, [r['url'] for r in all_reports.get(symbol, []) if r['url'] not in failed_urls])
         
         logger.info("\n✅ Traitement de toutes les sociétés terminé.")
         return results
 
+    def open_report(self):
+        """Rapport alimenté pendant l'analyse ; aucun en mode partition (il est produit à la fusion)."""
+        if self.shard:
+            return None
+        base_path = f"Analyse_Financiere_BRVM_{datetime.now().strftime('%Y%m%d_%H%M')}"
+        logger.info(f"Création du rapport : {base_path} ({', '.join(self.report_formats)})")
+        return StreamingReport({fmt: f"{base_path}.{fmt}" for fmt in self.report_formats},
+                               scope=report_scope(self.selection_rules))
+
+    def _render_report(self, results, report):
+        """Écrit les sections restantes (toutes si le rapport vient d'être ouvert) et finalise les fichiers."""
+        try:
+            for symbol, data in results:
+                report.add_section(symbol, data)
+            with self.run_metrics.stage('word_report'):
+                paths = report.close()
+            print("\n" + "="*80 + "\n🎉 RAPPORT FINALISÉ 🎉\n" + "\n".join(f"📁 Fichier sauvegardé : {path}" for path in paths) + "\n" + "="*80 + "\n")
+        except Exception as e:
+            logger.error(f"❌ Impossible d'enregistrer le rapport Word : {e}", exc_info=True)
+            report.abort()
+
     def create_word_report(self, results, output_path):
         logger.info(f"Création du rapport Word : {output_path}")
         try:
-            doc = Document()
-            doc.add_heading('Analyse Financière des Sociétés Cotées par IA (Gemini)', 0)
-            doc.add_paragraph(f"Rapport généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}")
-            doc.add_paragraph("Ce rapport analyse les états financiers certifiés pour l'année 2024 et tous les rapports publiés à partir de 2025.")
-
-            for symbol, data in results.items():
-                doc.add_heading(f"{symbol} - {data['nom']}", level=2)
-                
-                if not data.get('rapports_analyses'):
-                    status_message = data.get('statut', 'Aucun rapport pertinent n\'a été trouvé.')
-                    doc.add_paragraph(f"❌ {status_message}")
-                    continue
-                
-                table = doc.add_table(rows=1, cols=2, style='Table Grid')
-                table.autofit = False
-                table.columns[0].width = Pt(150)
-                table.columns[1].width = Pt(350)
-
-                headers = ['Titre du Rapport / Date de Publication', "Synthèse de l'Analyse par l'IA"]
-                header_cells = table.rows[0].cells
-                header_cells[0].text = headers[0]
-                header_cells[1].text = headers[1]
-
-                for rapport in data['rapports_analyses']:
-                    row_cells = table.add_row().cells
-                    cell_0_p = row_cells[0].paragraphs[0]
-                    cell_0_p.add_run(rapport['titre']).bold = True
-                    cell_0_p.add_run(f"\n(Date extraite : {rapport['date']})").italic = True
-                    row_cells[1].text = rapport.get('analyse_ia', 'Analyse non disponible.')
-
-                doc.add_paragraph()
-
-            doc.save(output_path)
-            print("\n" + "="*80 + "\n🎉 RAPPORT FINALISÉ 🎉\n" + f"📁 Fichier sauvegardé : {output_path}" + "\n" + "="*80 + "\n")
+            report = StreamingReport({'docx': output_path}, scope=report_scope(self.selection_rules))
         except Exception as e:
             logger.error(f"❌ Impossible d'enregistrer le rapport Word : {e}", exc_info=True)
+            return
+        self._render_report(results.items(), report)
+
+    def sync_results_to_sheet(self, results):
+        logger.info("Synchronisation des analyses vers Google Sheets...")
+        try:
+            SheetSync(self.spreadsheet, worksheets=self.worksheets).sync(results)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la synchronisation Google Sheets : {e}")
+
+    def _write_outputs(self, analysis_results, report=None):
+        if analysis_results:
+            if self.shard:
+                # Le rapport Word n'est produit qu'à la fusion des partitions (--merge-shards).
+                index, count = self.shard
+                output_filename = SHARD_RESULTS_PATTERN.format(index=index, count=count)
+                write_shard_results(output_filename, self.shard, analysis_results)
+                logger.info(f"🧩 Résultats de la partition {index}/{count} enregistrés : {output_filename}")
+            elif report is None or report.aborted:
+                # Rendu à partir de résultats déjà complets (journal, partitions, ou écriture interrompue).
+                self._render_report(analysis_results.items(), self.open_report())
+            else:
+                self._render_report([], report)
+            if self.sync_sheet:
+                with self.run_metrics.stage('sheet_sync'):
+                    self.sync_results_to_sheet(analysis_results)
+        else:
+            if report:
+                report.abort()
+            logger.warning("❌ Aucun résultat d'analyse à inclure dans le rapport.")
+            print("\n" + "="*60 + "\n⚠️  AUCUN RAPPORT GÉNÉRÉ\n" + "="*60)
+
+    def rebuild_from_journal(self, journal_path):
+        """Régénère le rapport Word à partir du journal seul, sans accès réseau."""
+        logger.info(f"📒 Reconstruction du rapport à partir du journal {journal_path}...")
+        self._write_outputs(AnalysisJournal.read_results(journal_path, self.original_societes_mapping))
+
+    def merge_shards(self, paths):
+        """Produit le rapport Word final à partir des résultats partiels des partitions, sans accès réseau."""
+        logger.info(f"🧩 Fusion de {len(paths)} fichier(s) de résultats partiels...")
+        try:
+            results = merge_shard_results(paths, self.original_societes_mapping)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"❌ Résultats partiels illisibles : {e}")
+            return
+        self._write_outputs(results)
+
+    def write_run_metrics(self):
+        self.run_metrics.log_summary()
+        try:
+            json_path = os.path.join(RUN_METRICS_DIR, f"run_metrics_{self.run_metrics.started_at.strftime('%Y%m%d_%H%M')}.json")
+            self.run_metrics.write_json(json_path)
+            logger.info(f"📈 Mesures du run enregistrées : {json_path}")
+            if self.prometheus_path:
+                self.run_metrics.write_prometheus(self.prometheus_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Impossible d'enregistrer les mesures du run : {e}")
 
     def run(self):
+        report = None
         try:
             logger.info("🚀 Démarrage de l'analyse BRVM...")
             if not self.configure_gemini(): return
-            self.setup_selenium()
-            if not self.driver or not self.authenticate_google_services(): return
+            if self.scraper_mode == 'selenium':
+                self.setup_selenium()
+                if not self.driver: return
+            if not self.authenticate_google_services(): return
             if not self.verify_and_filter_companies(): return
-            analysis_results = self.process_all_companies()
-            if analysis_results:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-                output_filename = f"Analyse_Financiere_BRVM_{timestamp}.docx"
-                self.create_word_report(analysis_results, output_filename)
-            else:
-                logger.warning("❌ Aucun résultat d'analyse à inclure dans le rapport.")
-                print("\n" + "="*60 + "\n⚠️  AUCUN RAPPORT GÉNÉRÉ\n" + "="*60)
+            self.apply_shard()
+            if self.shard and not self.societes_mapping:
+                # Partition vide : résultat partiel vide, pour que la fusion la compte comme terminée.
+                write_shard_results(SHARD_RESULTS_PATTERN.format(index=self.shard[0], count=self.shard[1]), self.shard, {})
+                return
+            report = self.open_report()
+            with self.run_metrics.stage('process_all_companies'):
+                analysis_results = self.process_all_companies(report=report)
+            self._write_outputs(analysis_results, report)
         except Exception as e:
             logger.critical(f"❌ Une erreur critique a interrompu l'analyse: {e}", exc_info=True)
         finally:
+            if report:
+                report.abort() # Sans effet si le rapport a été finalisé
             if self.driver:
                 self.driver.quit()
                 logger.info("Navigateur Selenium fermé.")
+            if self.cache:
+                self.cache.evict()
+                self.cache.close()
+            if self.metrics_store:
+                self.metrics_store.close()
+            if self.journal:
+                self.journal.close()
+            if self.crawl_state:
+                try:
+                    self.crawl_state.save()
+                except Exception as e:
+                    logger.warning(f"⚠️ Impossible d'enregistrer l'état de collecte : {e}")
+            self.write_run_metrics()
             logger.info("🏁 Fin du processus d'analyse.")
 
 # ------------------------------------------------------------------------------
-# 4. POINT D'ENTRÉE DU SCRIPT
+# 18. POINT D'ENTRÉE DU SCRIPT
 # ------------------------------------------------------------------------------
+def positive_int(value):
+    """Entier strictement positif ; utilisé comme type argparse."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"valeur invalide : {value!r} (entier >= 1 attendu)")
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyseur financier BRVM (avec IA).")
+    parser.add_argument('--force-reanalysis', action='store_true',
+                        help="Ignore le cache et renvoie tous les rapports à Gemini.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Désactive complètement le cache disque des analyses.")
+    parser.add_argument('--cache-db', default=CACHE_DB_PATH,
+                        help=f"Chemin de la base SQLite du cache (défaut : {CACHE_DB_PATH}).")
+    parser.add_argument('--cache-ttl-days', type=int, default=CACHE_TTL_DAYS,
+                        help=f"Durée de vie d'une analyse en cache, en jours (0 = illimitée, défaut : {CACHE_TTL_DAYS}).")
+    parser.add_argument('--cache-max-entries', type=int, default=CACHE_MAX_ENTRIES,
+                        help=f"Nombre maximal d'analyses conservées (0 = illimité, défaut : {CACHE_MAX_ENTRIES}).")
+    parser.add_argument('--workers', type=positive_int, default=ANALYSIS_WORKERS,
+                        help=f"Nombre de rapports analysés en parallèle (défaut : {ANALYSIS_WORKERS}).")
+    parser.add_argument('--rpm', type=positive_int, default=GEMINI_REQUESTS_PER_MINUTE,
+                        help=f"Quota de requêtes Gemini par minute (défaut : {GEMINI_REQUESTS_PER_MINUTE}).")
+    parser.add_argument('--scraper', choices=['auto', 'http', 'selenium'], default=SCRAPER_MODE,
+                        help="Mode de collecte des rapports : HTTP direct, Selenium, ou HTTP avec Selenium en secours (défaut : auto).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="N'analyse que les rapports apparus depuis le dernier passage.")
+    parser.add_argument('--crawl-state', default=CRAWL_STATE_PATH,
+                        help=f"Fichier JSON de l'état de collecte (défaut : {CRAWL_STATE_PATH}).")
+    parser.add_argument('--no-crawl-state', action='store_true',
+                        help="Désactive les requêtes conditionnelles et le suivi des rapports déjà vus.")
+    parser.add_argument('--page-selection', choices=['off', 'pages', 'text'], default=PAGE_SELECTION_MODE,
+                        help="Pré-sélection locale des pages financières (pypdf) : 'pages' envoie un PDF réduit, "
+                             "'text' uniquement le texte extrait, 'off' le PDF complet (défaut : off).")
+    parser.add_argument('--structured', action='store_true',
+                        help="Extraction structurée : le modèle renvoie les métriques (CA, RN, dividende...) en JSON, "
+                             "stockées dans une table SQLite interrogeable.")
+    parser.add_argument('--metrics-db', default=METRICS_DB_PATH,
+                        help=f"Base SQLite des métriques extraites (défaut : {METRICS_DB_PATH}).")
+    parser.add_argument('--sync-sheet', action='store_true',
+                        help=f"Écrit les rapports analysés dans l'onglet de chaque symbole (colonnes {SHEET_SYNC_ANCHOR_COLUMN} et suivantes).")
+    parser.add_argument('--journal', default=JOURNAL_PATH,
+                        help=f"Journal JSONL des analyses terminées (défaut : {JOURNAL_PATH}).")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprend un run interrompu : les rapports déjà présents dans le journal ne sont pas ré-analysés.")
+    parser.add_argument('--from-journal', action='store_true',
+                        help="Reconstruit uniquement le rapport Word à partir du journal, sans accès réseau.")
+    parser.add_argument('--metrics-prom', default=None,
+                        help="Écrit aussi les mesures du run au format textfile Prometheus à ce chemin.")
+    parser.add_argument('--max-attempts', type=positive_int, default=MAX_ATTEMPTS,
+                        help=f"Nombre de tentatives par appel en cas d'erreur transitoire (défaut : {MAX_ATTEMPTS}).")
+    parser.add_argument('--batch', type=positive_int, default=1, metavar='N',
+                        help=f"Analyse jusqu'à N rapports d'une même société en une seule requête Gemini "
+                             f"(lots scindés automatiquement si le contexte est dépassé ; max {BATCH_MAX_DOCUMENTS}, défaut : 1).")
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='i/N',
+                        help="N'analyse que la partition i sur N des sociétés (hachage stable des symboles) et écrit "
+                             "des résultats partiels au lieu du rapport Word.")
+    parser.add_argument('--merge-shards', nargs='+', default=None, metavar='FICHIER',
+                        help="Fusionne les résultats partiels des partitions en un seul rapport Word, sans accès réseau.")
+    parser.add_argument('--report-formats', nargs='+', choices=sorted(REPORT_STREAMS), default=REPORT_FORMATS,
+                        help="Formats du rapport, écrit société par société pendant l'analyse (défaut : docx). "
+                             "Ex. : --report-formats docx html md")
+    parser.add_argument('--selenium-wire', action='store_true',
+                        help="Utilise selenium-wire (interception des requêtes) au lieu de selenium simple pour la collecte Selenium.")
+    parser.add_argument('--selection-rules', default=None, metavar='FICHIER',
+                        help="Fichier JSON de règles de sélection des rapports, remplaçant REPORT_SELECTION_RULES "
+                             "(ex. [{\"annee_min\": 2025, \"types\": [\"etats_financiers\"]}]).")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
     SPREADSHEET_ID = '1EGXyg13ml8a9zr4OaUPnJN3i-rwVO2uq330yfxJXnSM'
     GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+    args = parse_args()
     
     print("="*50 + "\n      🔍 ANALYSEUR FINANCIER BRVM (AVEC IA) 🔍\n" + "="*50)
+
+    if args.from_journal:
+        BRVMAnalyzer(spreadsheet_id=SPREADSHEET_ID, api_key=None, report_formats=args.report_formats).rebuild_from_journal(args.journal)
+        sys.exit(0)
+    if args.merge_shards:
+        BRVMAnalyzer(spreadsheet_id=SPREADSHEET_ID, api_key=None, report_formats=args.report_formats).merge_shards(args.merge_shards)
+        sys.exit(0)
     
-    analyzer = BRVMAnalyzer(spreadsheet_id=SPREADSHEET_ID, api_key=GOOGLE_API_KEY)
+    selection_rules = None
+    if args.selection_rules:
+        try:
+            selection_rules = load_selection_rules(args.selection_rules)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Règles de sélection illisibles ({args.selection_rules}) : {e}")
+            sys.exit(1)
+
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(args.cache_db, ttl_days=args.cache_ttl_days, max_entries=args.cache_max_entries)
+    crawl_state = None if args.no_crawl_state else CrawlState(args.crawl_state)
+    metrics_store = MetricsStore(args.metrics_db) if args.structured else None
+    analyzer = BRVMAnalyzer(spreadsheet_id=SPREADSHEET_ID, api_key=GOOGLE_API_KEY,
+                            force_reanalysis=args.force_reanalysis, cache=cache,
+                            max_workers=args.workers, requests_per_minute=args.rpm,
+                            scraper_mode=args.scraper, crawl_state=crawl_state,
+                            incremental=args.incremental, page_selection=args.page_selection,
+                            metrics_store=metrics_store, sync_sheet=args.sync_sheet,
+                            journal=AnalysisJournal(args.journal, resume=args.resume),
+                            prometheus_path=args.metrics_prom, max_attempts=args.max_attempts,
+                            batch_size=args.batch, shard=args.shard, report_formats=args.report_formats,
+                            selenium_wire=args.selenium_wire,
+                            selection_rules=selection_rules)
     analyzer.run()
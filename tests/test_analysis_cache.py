@@ -0,0 +1,84 @@
+import pytest
+
+import main
+from main import AnalysisCache
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(main.time, 'time', clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return AnalysisCache(db_path=str(tmp_path / 'cache.sqlite'), **kwargs)
+
+
+def put(cache, name):
+    key = AnalysisCache.make_key(f'https://www.brvm.org/{name}.pdf', 'sha-' + name, 'v1')
+    cache.set(key, f'https://www.brvm.org/{name}.pdf', 'sha-' + name, 'v1', f'Analyse {name}')
+    return key
+
+
+def test_hit_and_miss(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    key = put(cache, 'a')
+    assert cache.get(key) == 'Analyse a'
+    assert cache.get(AnalysisCache.make_key('https://www.brvm.org/a.pdf', 'autre-sha', 'v1')) is None
+
+
+def test_key_changes_with_content_and_version():
+    base = AnalysisCache.make_key('u', 'sha', 'v1')
+    assert base != AnalysisCache.make_key('u', 'sha2', 'v1')
+    assert base != AnalysisCache.make_key('u', 'sha', 'v2')
+
+
+def test_ttl_expiry_on_get(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_days=1)
+    key = put(cache, 'a')
+    clock.now += 86400 - 1
+    assert cache.get(key) == 'Analyse a'
+    clock.now += 2
+    assert cache.get(key) is None
+    assert cache._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0] == 0
+
+
+def test_ttl_expiry_on_evict(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_days=1, max_entries=0)
+    old = put(cache, 'ancien')
+    clock.now += 86400 + 1
+    recent = put(cache, 'recent')
+    cache.evict()
+    assert cache.get(old) is None
+    assert cache.get(recent) == 'Analyse recent'
+
+
+def test_eviction_keeps_most_recently_accessed(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_days=0, max_entries=2)
+    keys = {}
+    for name in ('a', 'b', 'c'):
+        clock.now += 1
+        keys[name] = put(cache, name)
+    clock.now += 1
+    assert cache.get(keys['a']) == 'Analyse a'  # 'a' redevient la plus récente
+    cache.evict()
+    assert cache.get(keys['b']) is None
+    assert cache.get(keys['a']) == 'Analyse a'
+    assert cache.get(keys['c']) == 'Analyse c'
+
+
+def test_zero_limits_disable_eviction(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl_days=0, max_entries=0)
+    keys = [put(cache, str(i)) for i in range(5)]
+    clock.now += 10 * 365 * 86400
+    cache.evict()
+    assert all(cache.get(key) is not None for key in keys)
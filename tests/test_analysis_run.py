@@ -0,0 +1,57 @@
+import argparse
+import sqlite3
+
+import pytest
+
+import main
+
+
+def make_reports(analyzer, symbol, titles):
+    return [{'titre': title, 'url': f'https://www.brvm.org/{symbol}/{i}.pdf',
+             'classement': analyzer.report_classifier.classify(title), 'nouveau': True}
+            for i, title in enumerate(titles)]
+
+
+@pytest.mark.parametrize('batch_size', [1, 3])
+def test_unexpected_error_marks_reports_without_aborting_run(monkeypatch, batch_size):
+    analyzer = main.BRVMAnalyzer('', None, max_workers=2, batch_size=batch_size)
+    analyzer.societes_mapping = {symbol: analyzer.original_societes_mapping[symbol] for symbol in ('SNTS', 'ORAC')}
+    reports = {
+        'SNTS': make_reports(analyzer, 'SNTS', ["Etats financiers 2025", "Rapport annuel 2025"]),
+        'ORAC': make_reports(analyzer, 'ORAC', ["Etats financiers 2025"]),
+    }
+    monkeypatch.setattr(analyzer, '_find_all_reports', lambda: reports)
+
+    def analyze(symbol, report):
+        if symbol == 'SNTS':
+            raise sqlite3.OperationalError("database is locked")
+        return dict(analyzer._new_analysis(report), analyse_ia='Synthèse')
+
+    monkeypatch.setattr(analyzer, '_analyze_report', analyze)
+    monkeypatch.setattr(analyzer, '_analyze_reports_batch', lambda s, rs: [analyze(s, r) for r in rs])
+
+    results = analyzer.process_all_companies()
+
+    failed = results['SNTS']['rapports_analyses']
+    assert {r['titre'] for r in failed} == {'Etats financiers 2025', 'Rapport annuel 2025'}
+    assert all(r['a_reessayer'] and 'database is locked' in r['erreur'] for r in failed)
+    assert results['ORAC']['rapports_analyses'][0]['analyse_ia'] == 'Synthèse'
+    assert analyzer.run_metrics.counters['reports_failed'] == 2
+
+
+@pytest.mark.parametrize('value', ['0', '-3', 'abc'])
+def test_positive_int_rejects_invalid_values(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        main.positive_int(value)
+
+
+@pytest.mark.parametrize('flag', ['--rpm', '--workers', '--batch', '--max-attempts'])
+def test_cli_rejects_non_positive_values(flag):
+    with pytest.raises(SystemExit):
+        main.parse_args([flag, '0'])
+    assert getattr(main.parse_args([flag, '2']), flag.lstrip('-').replace('-', '_')) == 2
+
+
+def test_rate_limiter_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        main.RateLimiter(0)
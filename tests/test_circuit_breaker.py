@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+import requests
+
+import main
+from main import CircuitBreaker, PDFRejectedError, RetryPolicy
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type('Response', (), {'status_code': status, 'headers': {}})()
+
+
+def open_breaker(cooldown=0):
+    breaker = CircuitBreaker('test', failure_rate=0.5, window=4, min_calls=2, cooldown=cooldown)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open
+    return breaker
+
+
+def fail(error):
+    def func():
+        raise error
+    return func
+
+
+def test_opens_when_failure_rate_reached():
+    breaker = CircuitBreaker('test', failure_rate=0.5, window=4, min_calls=2, cooldown=60)
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_single_trial_after_cooldown():
+    breaker = open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()  # un seul essai à la fois
+
+
+def test_successful_trial_closes():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens():
+    breaker = open_breaker(cooldown=60)
+    breaker._opened_at -= 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()  # nouvelle pause complète
+
+
+def test_release_ends_trial_without_verdict():
+    breaker = open_breaker()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.is_open
+    assert breaker.allow()  # l'appel suivant sert de nouvel essai
+
+
+def test_release_from_other_thread_keeps_trial():
+    breaker = open_breaker()
+    assert breaker.allow()
+    thread = threading.Thread(target=breaker.release)
+    thread.start()
+    thread.join()
+    assert not breaker.allow()
+
+
+@pytest.mark.parametrize('error', [PDFRejectedError("Fichier PDF invalide ou vide."), HTTPError(400), HTTPError(404)])
+def test_trial_without_verdict_does_not_block_breaker(error):
+    breaker = open_breaker()
+    policy = RetryPolicy(max_attempts=1)
+    with pytest.raises(type(error)):
+        policy.call(fail(error), "essai", breaker=breaker)
+    assert policy.call(lambda: 'ok', "essai", breaker=breaker) == 'ok'
+    assert not breaker.is_open
+
+
+def test_client_errors_do_not_count_against_breaker():
+    breaker = CircuitBreaker('test', failure_rate=0.5, window=4, min_calls=2, cooldown=60)
+    policy = RetryPolicy(max_attempts=1)
+    for status in (404, 410, 404):
+        with pytest.raises(HTTPError):
+            policy.call(fail(HTTPError(status)), "essai", breaker=breaker)
+    assert not breaker.is_open
+
+
+def test_transient_errors_are_retried_then_open_breaker(monkeypatch):
+    monkeypatch.setattr(main.time, 'sleep', lambda _: None)
+    breaker = CircuitBreaker('test', failure_rate=0.5, window=4, min_calls=2, cooldown=60)
+    policy = RetryPolicy(max_attempts=2)
+    with pytest.raises(requests.ConnectionError):
+        policy.call(fail(requests.ConnectionError("coupure")), "essai", breaker=breaker)
+    assert breaker.is_open
+    with pytest.raises(main.CircuitOpenError):
+        policy.call(lambda: 'ok', "essai", breaker=breaker)
+
+
+def test_missing_pdf_is_rejected_not_retried():
+    class Response:
+        status_code = 404
+        headers = {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    analyzer = main.BRVMAnalyzer.__new__(main.BRVMAnalyzer)
+    analyzer.session = type('Session', (), {'get': lambda self, *a, **k: Response()})()
+    with pytest.raises(PDFRejectedError, match='HTTP 404'):
+        analyzer._download_pdf('https://www.brvm.org/sites/default/files/absent.pdf')
+
+
+def test_closing_clears_failures_from_the_outage():
+    breaker = CircuitBreaker('test', failure_rate=0.5, window=20, min_calls=6, cooldown=0)
+    for _ in range(6):
+        breaker.record_failure()
+    assert breaker.is_open
+    assert breaker.allow()
+    breaker.record_success()  # essai réussi : refermé
+    for _ in range(3):
+        breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+    assert breaker.allow()
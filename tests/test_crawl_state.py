@@ -0,0 +1,78 @@
+import json
+
+import main
+from main import CrawlState
+
+LISTING_HTML = """<table class="views-table"><tbody>
+<tr><td><a href="/fr/societe/sonatel">SONATEL SN</a></td></tr>
+<tr><td><a href="/fr/societe/nei-ceda">NEI-CEDA CI</a></td></tr>
+<tr><td><a href="/fr/societe/inconnue">SOCIETE INCONNUE</a></td></tr>
+</tbody></table>"""
+LISTING_URL = 'https://www.brvm.org/fr/rapports-societes-cotees?page=0'
+
+
+class Response:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, **kwargs):
+        return self.responses.pop(0)
+
+
+def make_analyzer(tmp_path, responses):
+    analyzer = main.BRVMAnalyzer('', None, crawl_state=CrawlState(str(tmp_path / 'etat.json')))
+    analyzer.session = Session(responses)
+    return analyzer
+
+
+def fetch_listing(analyzer):
+    return analyzer._resolve_listing_rows(analyzer._fetch_page(LISTING_URL, analyzer._extract_listing_rows))
+
+
+def test_listing_rows_are_cached_raw_and_resolved_with_current_mapping(tmp_path):
+    analyzer = make_analyzer(tmp_path, [Response(200, LISTING_HTML, {'ETag': '"v1"'}), Response(304)])
+    first = fetch_listing(analyzer)
+    assert [link['symbol'] for link in first] == ['SNTS', 'NEIC']
+    assert analyzer.crawl_state.pages[LISTING_URL]['payload'][2] == ['SOCIETE INCONNUE', '/fr/societe/inconnue']
+
+    # Émetteur ajouté au mapping entre deux passages : reconnu malgré la réponse 304.
+    mapping = dict(analyzer.original_societes_mapping)
+    mapping['INCO'] = {'nom_rapport': 'SOCIETE INCONNUE', 'alternatives': ['societe inconnue']}
+    analyzer.symbol_matcher = main.SymbolMatcher(mapping)
+    second = fetch_listing(analyzer)
+    assert [link['symbol'] for link in second] == ['SNTS', 'NEIC', 'INCO']
+    assert analyzer.run_metrics.counters['http_304'] == 1
+
+
+def test_state_saved_with_version_and_reloaded(tmp_path):
+    state = CrawlState(str(tmp_path / 'etat.json'))
+    state.store_page(LISTING_URL, {'ETag': '"v1"'}, [['SONATEL SN', '/fr/societe/sonatel']])
+    state.mark_seen('SNTS', ['https://www.brvm.org/a.pdf'])
+    state.save()
+    reloaded = CrawlState(str(tmp_path / 'etat.json'))
+    assert reloaded.conditional_headers(LISTING_URL) == {'If-None-Match': '"v1"'}
+    assert not reloaded.is_new_report('SNTS', 'https://www.brvm.org/a.pdf')
+
+
+def test_state_from_older_format_drops_pages_but_keeps_seen_reports(tmp_path):
+    path = tmp_path / 'etat.json'
+    path.write_text(json.dumps({
+        'pages': {LISTING_URL: {'etag': '"v1"', 'last_modified': None,
+                                'payload': [{'symbol': 'SNTS', 'url': 'https://www.brvm.org/fr/societe/sonatel'}]}},
+        'seen_reports': {'SNTS': ['https://www.brvm.org/a.pdf']},
+    }), encoding='utf-8')
+    state = CrawlState(str(path))
+    assert state.pages == {}
+    assert state.conditional_headers(LISTING_URL) == {}
+    assert not state.is_new_report('SNTS', 'https://www.brvm.org/a.pdf')
@@ -0,0 +1,178 @@
+import gc
+import re
+import weakref
+from datetime import datetime
+
+import pytest
+
+from main import (REPORT_SCOPE, REPORT_SELECTION_RULES, ReportClassifier, ReportIndex, StreamingReport,
+                  report_scope, rule_matches)
+
+
+# --- Filtre d'origine (BRVMAnalyzer._extract_date_from_text et _select_reports_to_analyze), repris tel quel ---
+def baseline_extract_date_from_text(text):
+    if not text: return datetime(1900, 1, 1)
+    year_match = re.search(r'\b(20\d{2})\b', text)
+    if not year_match: return datetime(1900, 1, 1)
+    year = int(year_match.group(1))
+    text_lower = text.lower()
+    trim_match = re.search(r't(\d)|(\d)\s*er\s*trimestre', text_lower)
+    if trim_match:
+        trimester = int(trim_match.group(1) or trim_match.group(2))
+        return datetime(year, trimester * 3, 1)
+    sem_match = re.search(r's(\d)|(\d)\s*er\s*semestre', text_lower)
+    if sem_match:
+        semester = int(sem_match.group(1) or sem_match.group(2))
+        return datetime(year, 6 if semester == 1 else 12, 1)
+    if 'annuel' in text_lower or '31/12' in text or '31 dec' in text_lower: return datetime(year, 12, 31)
+    return datetime(year, 6, 15)
+
+
+def baseline_select(titles):
+    date_2024_start = datetime(2024, 1, 1)
+    date_2025_start = datetime(2025, 1, 1)
+    keywords_financiers = ['états financiers', 'etats financiers', 'certifié', 'commissaires aux comptes', 'rapport annuel']
+    selected = []
+    for title in titles:
+        report_date = baseline_extract_date_from_text(title)
+        title_lower = title.lower()
+        if date_2024_start <= report_date < date_2025_start:
+            if any(keyword in title_lower for keyword in keywords_financiers):
+                selected.append(title)
+        elif report_date >= date_2025_start:
+            selected.append(title)
+    return selected
+
+
+# Titres relevés sur les pages de sociétés de la BRVM (un symbole par liste, dans l'ordre de la page).
+CORPUS = {
+    'SNTS': [
+        "Etats financiers consolidés au 31/12/2024",
+        "Etats financiers annuels sociaux 2024",
+        "Rapport général des commissaires aux comptes – exercice 2024",
+        "Rapport spécial des commissaires aux comptes – exercice 2024",
+        "Rapport annuel 2024",
+        "Rapport d'activité du 1er trimestre 2025",
+        "Rapport d'activité du 3ème trimestre 2024",
+        "Bilan 2024",
+        "Comptes consolidés 2024",
+        "Communiqué - Paiement du dividende 2024",
+        "Convocation à l'Assemblée Générale Ordinaire 2025",
+        "Etats financiers 2023",
+        "Rapport annuel 2023",
+    ],
+    'SGBC': [
+        "Etats financiers annuels 2024",
+        "Etats financiers certifiés au 31/12/2024",
+        "Résultats semestriels 2025",
+        "Rapport financier semestriel 2025",
+        "Rapport d'activité trimestriel 2025",
+        "Rapport d'activité trimestriel au 30.06.2025",
+        "Etats financiers au 30.06.2025",
+        "Etats financiers S1 2024",
+        "Communiqué de presse 2024",
+        "Avis de convocation AGO",
+    ],
+    'ORAC': [
+        "Etats financiers 2024",
+        "Rapport des commissaires aux comptes sur les états financiers 2024",
+        "Indicateurs d'activité au 31 mars 2025",
+        "Rapport d'activité 2ème trimestre 2025",
+        "Rapport d'activité T2 2025",
+        "Etats Financiers T3 2025",
+        "Communiqué – Résultats annuels 2024",
+        "Procès-verbal de l'Assemblée Générale Mixte 2025",
+    ],
+}
+
+# Publications en double écartées volontairement : la version certifiée l'emporte sur la provisoire.
+DEDUPLICATED = {
+    'SGBC': ["Etats financiers annuels 2024"],
+    'ORAC': ["Rapport d'activité T2 2025"],
+}
+
+
+def make_index(classifier=None):
+    classifier = classifier or ReportClassifier()
+    index = ReportIndex()
+    for symbol, titles in CORPUS.items():
+        for i, title in enumerate(titles):
+            index.add(symbol, {'titre': title, 'url': f'https://www.brvm.org/{symbol}/{i}.pdf',
+                               'classement': classifier.classify(title)})
+    return index
+
+
+@pytest.mark.parametrize('symbol', sorted(CORPUS))
+def test_default_rules_match_baseline_filter(symbol):
+    classifier = ReportClassifier()
+    matched = [t for t in CORPUS[symbol]
+               if any(rule_matches(rule, classifier.classify(t)) for rule in REPORT_SELECTION_RULES)]
+    assert matched == baseline_select(CORPUS[symbol])
+
+
+@pytest.mark.parametrize('symbol', sorted(CORPUS))
+def test_selection_only_drops_declared_duplicates(symbol):
+    selected = {r['titre'] for r in make_index().select(symbol, REPORT_SELECTION_RULES)}
+    expected = set(baseline_select(CORPUS[symbol])) - set(DEDUPLICATED.get(symbol, []))
+    assert selected == expected
+
+
+def test_certified_version_wins_whatever_its_position():
+    selected = [r['titre'] for r in make_index().select('SGBC', REPORT_SELECTION_RULES)]
+    assert "Etats financiers certifiés au 31/12/2024" in selected
+    assert "Etats financiers annuels 2024" not in selected
+
+
+@pytest.mark.parametrize('title, periode', [
+    ("Résultats semestriels 2025", 'S1'),
+    ("Rapport financier semestriel 2025", 'S1'),
+    ("Etats financiers au 30.06.2025", 'S1'),
+    ("Etats financiers au 30/06/2025", 'S1'),
+    ("Rapport d'activité trimestriel au 30.06.2025", 'T2'),
+    ("Rapport d'activité trimestriel 2025", 'trimestriel'),
+    ("Rapport d'activité du 1er trimestre 2025", 'T1'),
+    ("Indicateurs d'activité au 31 mars 2025", 'T1'),
+    ("Etats financiers S2 2025", 'S2'),
+    ("Etats financiers certifiés au 31/12/2024", 'annuel'),
+    ("Bilan 2024", None),
+])
+def test_periods(title, periode):
+    assert ReportClassifier().classify(title).periode == periode
+
+
+@pytest.mark.parametrize('title, variante', [
+    ("Etats financiers consolidés au 31/12/2024", 'consolide'),
+    ("Etats financiers annuels sociaux 2024", 'social'),
+    ("Rapport général des commissaires aux comptes – exercice 2024", 'general'),
+    ("Rapport spécial des commissaires aux comptes – exercice 2024", 'special'),
+    ("Assemblée Générale Ordinaire 2025", None),
+])
+def test_variants(title, variante):
+    assert ReportClassifier().classify(title).variante == variante
+
+
+def test_classifier_instances_are_not_kept_alive_by_the_cache():
+    classifier = ReportClassifier()
+    ref = weakref.ref(classifier)
+    first = classifier.classify("Etats financiers S1 2025")
+    del classifier
+    gc.collect()
+    assert ref() is None
+    assert ReportClassifier().classify("Etats financiers S1 2025") is first  # cache partagé
+
+
+def test_report_scope_follows_active_rules():
+    assert report_scope(REPORT_SELECTION_RULES) == REPORT_SCOPE
+    custom = [{'annee_min': 2025, 'periodes': ['S1', 'S2'], 'types': ['etats_financiers']}, {'certifie': True}]
+    assert report_scope(custom) == (
+        "Ce rapport analyse les rapports retenus par les règles de sélection suivantes : "
+        "exercices à partir de 2025, périodes S1, S2, types etats_financiers ; rapports certifiés.")
+
+
+def test_streamed_report_header_uses_custom_scope(tmp_path):
+    path = tmp_path / 'rapport.md'
+    report = StreamingReport({'md': str(path)}, scope=report_scope([{'annee_min': 2026}]))
+    report.close()
+    text = path.read_text(encoding='utf-8')
+    assert 'exercices à partir de 2026' in text
+    assert REPORT_SCOPE not in text
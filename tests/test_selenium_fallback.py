@@ -0,0 +1,64 @@
+import pytest
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+import main
+
+LISTING = """<table class="views-table"><tbody>
+<tr><td><a href="/fr/societe/sonatel">SONATEL SN</a></td></tr>
+<tr><td><a href="/fr/societe/orange-ci">ORANGE CI</a></td></tr>
+<tr><td><a href="/fr/societe/sgbci">SOCIETE GENERALE CI</a></td></tr>
+</tbody></table>"""
+
+
+def company_page(*titles):
+    rows = ''.join(f'<tr><td><a href="/sites/default/files/{i}.pdf">{t}</a></td></tr>' for i, t in enumerate(titles))
+    return f'<table class="views-table"><tbody>{rows}</tbody></table>'
+
+
+class FakeDriver:
+    """Pilote synchrone : get() charge la page, find_element() cherche le tableau."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.page_source = ''
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+        page = self.pages.get(url, '<html></html>')
+        if isinstance(page, Exception):
+            raise page
+        self.page_source = page
+
+    def find_element(self, by, value):
+        if 'views-table' not in self.page_source:
+            raise NoSuchElementException(value)
+        return object()
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(main, 'SELENIUM_WAIT_SECONDS', 0.2)
+    analyzer = main.BRVMAnalyzer('', None, scraper_mode='selenium', base_url='https://brvm.test')
+    analyzer.societes_mapping = {s: analyzer.original_societes_mapping[s] for s in ('SNTS', 'ORAC', 'SGBC')}
+    return analyzer
+
+
+def test_pages_loaded_in_order_and_one_bad_company_page_is_skipped(analyzer):
+    listing = 'https://brvm.test/fr/rapports-societes-cotees'
+    analyzer.driver = FakeDriver({
+        f'{listing}?page=0': LISTING,
+        'https://brvm.test/fr/societe/sonatel': company_page("Etats financiers 2024", "Rapport annuel 2024"),
+        'https://brvm.test/fr/societe/orange-ci': WebDriverException("tab crashed"),
+        'https://brvm.test/fr/societe/sgbci': company_page("Etats financiers S1 2025"),
+    })
+    reports = analyzer._find_all_reports_selenium()
+    assert {symbol: len(r) for symbol, r in reports.items()} == {'SNTS': 2, 'SGBC': 1}
+    assert analyzer.driver.visited[:2] == [f'{listing}?page=0', f'{listing}?page=1']
+    assert analyzer.run_metrics.summary()['stages']['selenium_page_load']['count'] == 5
+
+
+def test_missing_table_stops_pagination_and_returns_none(analyzer):
+    analyzer.driver = FakeDriver({})
+    assert analyzer._find_all_reports_selenium() is None
+    assert len(analyzer.driver.visited) == 1
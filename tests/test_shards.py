@@ -0,0 +1,45 @@
+import json
+
+import main
+
+
+def make_analyzer(monkeypatch, crawl_result, shard=(2, 4)):
+    analyzer = main.BRVMAnalyzer('', None, shard=shard)
+    analyzer.societes_mapping = dict(analyzer.original_societes_mapping)
+    analyzer.apply_shard()
+    monkeypatch.setattr(analyzer, '_find_all_reports', lambda: crawl_result)
+    return analyzer
+
+
+def test_shard_without_listed_company_still_writes_its_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analyzer = make_analyzer(monkeypatch, {})
+    analyzer._write_outputs(analyzer.process_all_companies())
+
+    path = tmp_path / main.SHARD_RESULTS_PATTERN.format(index=2, count=4)
+    data = json.loads(path.read_text(encoding='utf-8'))
+    assert data['partition'] == {'index': 2, 'total': 4}
+    assert set(data['resultats']) == set(analyzer.societes_mapping)
+    assert all(result['statut'] and not result['rapports_analyses'] for result in data['resultats'].values())
+
+
+def test_failed_crawl_writes_no_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analyzer = make_analyzer(monkeypatch, None)
+    analyzer._write_outputs(analyzer.process_all_companies())
+    assert not list(tmp_path.glob('resultats_partition_*.json'))
+
+
+def test_empty_listing_does_not_fall_back_to_selenium(monkeypatch):
+    analyzer = main.BRVMAnalyzer('', None, scraper_mode='auto')
+    monkeypatch.setattr(analyzer, '_find_all_reports_http', lambda: {})
+    monkeypatch.setattr(analyzer, 'setup_selenium', lambda: (_ for _ in ()).throw(AssertionError("Selenium démarré")))
+    assert analyzer._crawl_reports() == {}
+
+
+def test_failed_http_crawl_falls_back_to_selenium(monkeypatch):
+    analyzer = main.BRVMAnalyzer('', None, scraper_mode='auto')
+    monkeypatch.setattr(analyzer, '_find_all_reports_http', lambda: None)
+    monkeypatch.setattr(analyzer, 'setup_selenium', lambda: None)
+    monkeypatch.setattr(analyzer, '_find_all_reports_selenium', lambda: {'SNTS': []})
+    assert analyzer._crawl_reports() == {'SNTS': []}
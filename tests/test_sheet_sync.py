@@ -0,0 +1,73 @@
+from main import SHEET_SYNC_HEADERS, SheetSync
+
+
+class FakeWorksheet:
+    def __init__(self, title, sheet_id, col_count):
+        self.title = title
+        self.id = sheet_id
+        self.col_count = col_count
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets):
+        self._worksheets = worksheets
+        self.calls = []
+
+    def worksheets(self):
+        self.calls.append(('worksheets',))
+        return self._worksheets
+
+    def batch_update(self, body):
+        self.calls.append(('batch_update', body))
+        for request in body['requests']:
+            append = request['appendDimension']
+            ws = next(ws for ws in self._worksheets if ws.id == append['sheetId'])
+            ws.col_count += append['length']
+
+    def values_batch_get(self, ranges, params=None):
+        self.calls.append(('values_batch_get', ranges))
+        for ws in self._worksheets:
+            if any(r.startswith(f"'{ws.title}'!") for r in ranges):
+                assert ws.col_count >= 35, f"{ws.title} : exceeds grid limits"
+        return {'valueRanges': [{} for _ in ranges]}
+
+    def values_batch_update(self, body):
+        self.calls.append(('values_batch_update', body))
+
+
+def results_for(*symbols):
+    return {
+        symbol: {'rapports_analyses': [{'titre': 'Etats financiers 2024', 'url': f'https://brvm.org/{symbol}.pdf',
+                                        'date': '2024', 'analyse_ia': 'Synthèse'}]}
+        for symbol in symbols
+    }
+
+
+def test_narrow_tabs_are_widened_in_one_call():
+    tabs = [FakeWorksheet('SNTS', 1, 26), FakeWorksheet('ORAC', 2, 40), FakeWorksheet('SGBC', 3, 30)]
+    spreadsheet = FakeSpreadsheet(tabs)
+    sync = SheetSync(spreadsheet, worksheets={ws.title: ws for ws in tabs})
+
+    assert sync.sync(results_for('SNTS', 'ORAC', 'SGBC')) == 6
+
+    kinds = [call[0] for call in spreadsheet.calls]
+    assert kinds == ['batch_update', 'values_batch_get', 'values_batch_update']
+    appended = spreadsheet.calls[0][1]['requests']
+    assert [(r['appendDimension']['sheetId'], r['appendDimension']['length']) for r in appended] == [(1, 9), (3, 5)]
+    assert sync.calls == 3
+
+
+def test_wide_tabs_need_no_extra_call():
+    tabs = [FakeWorksheet('SNTS', 1, 35)]
+    spreadsheet = FakeSpreadsheet(tabs)
+    SheetSync(spreadsheet, worksheets={'SNTS': tabs[0]}).sync(results_for('SNTS'))
+    assert [call[0] for call in spreadsheet.calls] == ['values_batch_get', 'values_batch_update']
+
+
+def test_worksheets_are_listed_when_not_provided():
+    tabs = [FakeWorksheet('SNTS', 1, 26)]
+    spreadsheet = FakeSpreadsheet(tabs)
+    SheetSync(spreadsheet).sync(results_for('SNTS'))
+    assert [call[0] for call in spreadsheet.calls][:2] == ['worksheets', 'batch_update']
+    header_write = spreadsheet.calls[-1][1]['data'][0]
+    assert header_write == {'range': "'SNTS'!AA1:AI1", 'values': [SHEET_SYNC_HEADERS]}
@@ -0,0 +1,64 @@
+import zipfile
+
+from docx import Document
+
+from main import REPORT_TITLE, StreamingReport
+
+
+def rapport(titre, analyse='Synthèse', **extra):
+    return dict({'titre': titre, 'url': f'https://www.brvm.org/{len(titre)}.pdf', 'date': '2025-06-30',
+                 'analyse_ia': analyse}, **extra)
+
+
+SECTIONS = [
+    ('SNTS', {'nom': 'SONATEL SN', 'rapports_analyses': [
+        rapport("Etats financiers S1 2025", "Chiffre d'affaires en hausse de 8 % <&> dividende maintenu"),
+        rapport("Rapport d'activité T1 2025"),
+    ]}),
+    ('ORAC', {'nom': 'ORANGE CI', 'rapports_analyses': [
+        rapport("Etats financiers 2025"),
+        rapport("Rapport annuel 2024", a_reessayer=True, erreur="503"),
+    ]}),
+    ('SGBC', {'nom': 'SOCIETE GENERALE CI', 'rapports_analyses': [
+        rapport("Etats financiers T3 2025", a_reessayer=True, erreur="timeout"),
+    ]}),
+    ('BOAC', {'nom': 'BANK OF AFRICA CI', 'rapports_analyses': [],
+              'statut': 'Aucun nouveau rapport pertinent depuis le dernier passage.'}),
+]
+
+
+def test_streamed_docx_reopens_with_expected_content(tmp_path):
+    path = tmp_path / 'rapport.docx'
+    report = StreamingReport({'docx': str(path)})
+    for symbol, data in SECTIONS:
+        report.add_section(symbol, data)
+    assert not path.exists()  # le fichier définitif n'apparaît qu'à close()
+    report.close()
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+    document = Document(str(path))
+    headings = [p.text for p in document.paragraphs if p.style.name.startswith(('Heading', 'Title'))]
+    assert headings == [REPORT_TITLE, 'SNTS - SONATEL SN', 'ORAC - ORANGE CI',
+                        'SGBC - SOCIETE GENERALE CI', 'BOAC - BANK OF AFRICA CI']
+
+    # Un tableau par société ayant au moins un rapport analysé.
+    assert len(document.tables) == 2
+    assert len(document.tables[0].rows) == 3
+    assert len(document.tables[1].rows) == 2
+    assert '<&>' in document.tables[0].rows[1].cells[1].text
+
+    texts = [p.text for p in document.paragraphs]
+    assert any(t.startswith('⚠️ 1 rapport(s) non analysé(s)') and 'Rapport annuel 2024' in t for t in texts)
+    assert any('Etats financiers T3 2025' in t for t in texts)
+    assert '❌ Aucun nouveau rapport pertinent depuis le dernier passage.' in texts
+    # La section finale (sectPr) reste le dernier élément du corps.
+    assert document.element.body[-1].tag.endswith('}sectPr')
+
+
+def test_abort_leaves_no_file(tmp_path):
+    path = tmp_path / 'rapport.docx'
+    report = StreamingReport({'docx': str(path), 'md': str(tmp_path / 'rapport.md')})
+    report.add_section(*SECTIONS[0])
+    report.abort()
+    assert list(tmp_path.iterdir()) == []
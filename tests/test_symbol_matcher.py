@@ -0,0 +1,58 @@
+import pytest
+
+import main
+from main import SymbolMatcher, normalize_text
+
+MAPPING = main.BRVMAnalyzer('', None).original_societes_mapping
+
+
+def linear_scan(mapping, company_name_normalized):
+    """Recherche d'origine (premier symbole dont une alternative est contenue dans le nom), alternatives normalisées."""
+    for symbol, info in mapping.items():
+        for alt in info['alternatives']:
+            if normalize_text(alt) in company_name_normalized:
+                return symbol
+    return None
+
+
+@pytest.fixture(scope='module')
+def matcher():
+    return SymbolMatcher(MAPPING)
+
+
+def test_longest_match_wins_over_mapping_order():
+    mapping = {
+        'SNTS': {'nom_rapport': 'SONATEL SN', 'alternatives': ['sonatel']},
+        'FCTC': {'nom_rapport': 'FCTC SONATEL', 'alternatives': ['fctc sonatel']},
+    }
+    matcher = SymbolMatcher(mapping)
+    assert matcher.match(normalize_text('FCTC SONATEL 2021-2026')) == 'FCTC'
+    assert matcher.match(normalize_text('SONATEL SN')) == 'SNTS'
+
+
+def test_leftmost_match_wins_between_equal_lengths():
+    mapping = {
+        'AAAA': {'nom_rapport': 'A', 'alternatives': ['alpha']},
+        'BBBB': {'nom_rapport': 'B', 'alternatives': ['omega']},
+    }
+    assert SymbolMatcher(mapping).match('omega et alpha') == 'BBBB'
+
+
+def test_hyphenated_alternative_matches_normalized_name(matcher):
+    assert normalize_text('NEI-CEDA CI') == 'nei ceda ci'
+    assert matcher.match('nei ceda ci') == 'NEIC'
+
+
+@pytest.mark.parametrize('name', ['', 'societe inconnue sa', 'banque regionale'])
+def test_no_match(matcher, name):
+    assert matcher.match(name) is None
+
+
+def test_same_result_as_linear_scan_on_real_mapping(matcher):
+    names = set()
+    for info in MAPPING.values():
+        names.add(normalize_text(info['nom_rapport']))
+        names.update(normalize_text(alt) for alt in info['alternatives'])
+        names.add(normalize_text(f"{info['nom_rapport']} - rapports financiers"))
+    for name in sorted(names):
+        assert matcher.match(name) == linear_scan(MAPPING, name), name